@@ -26,6 +26,17 @@ $(cat Accounting/Current_Month.md)
 "
 fi
 
+# Trends over the full Odoo history kept by the accounting watcher
+if [ -f watchers/odoo_sync.db ]; then
+    HISTORY=$(watchers/.venv/bin/python watchers/odoo_sync.py --briefing 2>/dev/null)
+    if [ -n "$HISTORY" ]; then
+        CONTEXT+="=== Odoo history (local store) ===
+${HISTORY}
+
+"
+    fi
+fi
+
 if [ -d Done ] && [ "$(ls Done/ 2>/dev/null)" ]; then
     CONTEXT+="=== Recent Done/ files (last 7 days) ===
 $(find Done/ -name '*.md' -mtime -7 -exec basename {} \;)
@@ -64,7 +75,7 @@ Generate the briefing with these sections:
 # CEO Briefing — ${DATE}
 
 ## 1. Revenue Summary
-Compare current revenue vs targets. List all invoices and their payment status.
+Compare current revenue vs targets and against previous months. List all invoices and their payment status.
 
 ## 2. Completed Tasks This Week
 List items from Done/ folder completed recently.
@@ -1,123 +1,255 @@
-import os
-import xmlrpc.client, time, json
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime
-from dotenv import load_dotenv
 
-load_dotenv(Path(__file__).parent / '.env')
+import odoo_feed
+import odoo_sync
+import odoo_utils
+from config import get_odoo_config
 
 VAULT = Path('/mnt/d/ai-employee-vault')
-ODOO_URL = os.getenv('ODOO_URL', 'http://localhost:8069')
-DB = os.getenv('ODOO_DB', 'odoo_main')
-USER = os.getenv('ODOO_USERNAME', 'admin')
-PASSWORD = os.getenv('ODOO_PASSWORD', 'admin')
+SNAPSHOT_ROWS = 20
+
+# One worker per dataset; threads persist, so each keeps its keep-alive connection
+_pool = ThreadPoolExecutor(max_workers=len(odoo_sync.DATASETS), thread_name_prefix='odoo-sync')
+_inflight = {}
+_latency = {}  # dataset -> seconds taken by its last completed sync
+_wake = threading.Event()  # set by the change feed to sync before the interval is up
 
 def get_connection():
-    common = xmlrpc.client.ServerProxy(f'{ODOO_URL}/xmlrpc/2/common', allow_none=True)
-    uid = common.authenticate(DB, USER, PASSWORD, {})
-    models = xmlrpc.client.ServerProxy(f'{ODOO_URL}/xmlrpc/2/object', allow_none=True)
-    return uid, models
-
-def get_recent_transactions(uid, models):
-    return models.execute_kw(DB, uid, PASSWORD, 'account.move', 'search_read',
-        [[['state', '=', 'posted']]], {'limit': 20, 'fields': ['name', 'amount_total', 'partner_id', 'invoice_date', 'payment_state', 'move_type']})
-
-def get_crm_leads(uid, models):
-    return models.execute_kw(DB, uid, PASSWORD, 'crm.lead', 'search_read',
-        [[]], {'limit': 20, 'fields': ['name', 'partner_id', 'expected_revenue', 'stage_id', 'type', 'probability', 'create_date'],
-               'order': 'create_date desc'})
-
-def get_sales_orders(uid, models):
-    return models.execute_kw(DB, uid, PASSWORD, 'sale.order', 'search_read',
-        [[]], {'limit': 20, 'fields': ['name', 'partner_id', 'amount_total', 'state', 'date_order'],
-               'order': 'date_order desc'})
-
-def get_inventory(uid, models):
-    return models.execute_kw(DB, uid, PASSWORD, 'product.product', 'search_read',
-        [[['type', '=', 'product']]], {'fields': ['name', 'default_code', 'qty_available', 'list_price']})
-
-def get_stock_moves(uid, models):
-    return models.execute_kw(DB, uid, PASSWORD, 'stock.move', 'search_read',
-        [[['state', '=', 'done']]], {'limit': 20, 'fields': ['product_id', 'quantity', 'date', 'origin', 'location_dest_id'],
-                                       'order': 'date desc'})
+    # Shared client: cached uid, keep-alive connection, transport from odoo.transport config
+    return odoo_utils.get_client()
+
+def _latest(store, model, state=None, limit=SNAPSHOT_ROWS):
+    # Served by the indexed date column; only the rows shown are decoded
+    sql = 'SELECT data FROM records WHERE model = ?'
+    params = [model]
+    if state is not None:
+        sql += ' AND state = ?'
+        params.append(state)
+    rows = store.query(sql + ' ORDER BY date DESC, id DESC LIMIT ?', (*params, limit))
+    return [json.loads(r['data']) for r in rows]
+
+# Snapshot readers work on the local store that odoo_sync keeps up to date
+def get_recent_transactions(store):
+    return _latest(store, 'account.move', 'posted')
+
+def get_crm_leads(store):
+    return _latest(store, 'crm.lead')
+
+def get_sales_orders(store):
+    return _latest(store, 'sale.order')
+
+def get_inventory(store):
+    rows = store.query("SELECT data FROM records WHERE model = 'product.product' AND kind = 'product'")
+    products = [json.loads(r['data']) for r in rows]
+    return sorted(products, key=lambda p: (p['default_code'] or '', p['name'], p['id']))
+
+def get_stock_moves(store):
+    return _latest(store, 'stock.move', 'done')
+
+def _header(doc_type, digest, *datasets):
+    content = f'---\ntype: {doc_type}\ndate: {datetime.now().isoformat()}\ndigest: {digest}\n'
+    fetch = ', '.join(f'{d}: {round(_latency[d] * 1000)}' for d in datasets if d in _latency)
+    if fetch:
+        content += f'fetch_ms: {{{fetch}}}\n'
+    return content + '---\n'
+
+def _write_snapshot(path, doc_type, body, *datasets):
+    """Write a snapshot unless its content matches the digest already on disk.
+
+    The digest covers the body only, so a fresh date or fetch_ms in the
+    frontmatter does not make sync_vault.sh commit an otherwise identical file.
+    Returns True if the file was written.
+    """
+    digest = hashlib.sha256(body.encode()).hexdigest()[:16]
+    if path.exists() and re.search(rf'^digest: {digest}$', path.read_text(), re.MULTILINE):
+        return False
+    path.write_text(_header(doc_type, digest, *datasets) + body)
+    return True
 
 def write_accounting(txns):
-    content = f'---\ntype: accounting_update\ndate: {datetime.now().isoformat()}\n---\n'
+    body = ''
     if not txns:
-        content += '\nNo posted transactions yet.\n'
+        body += '\nNo posted transactions yet.\n'
     for t in txns:
         partner = t['partner_id'][1] if t['partner_id'] else 'N/A'
-        content += f'- {t["name"]}: ${t["amount_total"]} from {partner} ({t["payment_state"]})\n'
-    (VAULT / 'Accounting' / 'Current_Month.md').write_text(content)
+        body += f'- {t["name"]}: ${t["amount_total"]} from {partner} ({t["payment_state"]})\n'
+    return _write_snapshot(VAULT / 'Accounting' / 'Current_Month.md', 'accounting_update', body, 'transactions')
 
 def write_crm(leads):
-    content = f'---\ntype: crm_update\ndate: {datetime.now().isoformat()}\n---\n'
     opportunities = [l for l in leads if l['type'] == 'opportunity']
     raw_leads = [l for l in leads if l['type'] == 'lead']
 
-    content += f'\n## Opportunities ({len(opportunities)})\n'
+    body = f'\n## Opportunities ({len(opportunities)})\n'
     for l in opportunities:
         partner = l['partner_id'][1] if l['partner_id'] else 'N/A'
         stage = l['stage_id'][1] if l['stage_id'] else 'N/A'
-        content += f'- **{l["name"]}** | {partner} | ${l["expected_revenue"]} | {stage} | {l["probability"]}%\n'
+        body += f'- **{l["name"]}** | {partner} | ${l["expected_revenue"]} | {stage} | {l["probability"]}%\n'
 
-    content += f'\n## Leads ({len(raw_leads)})\n'
+    body += f'\n## Leads ({len(raw_leads)})\n'
     for l in raw_leads:
-        content += f'- **{l["name"]}** | ${l["expected_revenue"]}\n'
+        body += f'- **{l["name"]}** | ${l["expected_revenue"]}\n'
 
-    (VAULT / 'CRM' / 'Pipeline.md').write_text(content)
+    return _write_snapshot(VAULT / 'CRM' / 'Pipeline.md', 'crm_update', body, 'leads')
 
 def write_sales(orders):
-    content = f'---\ntype: sales_update\ndate: {datetime.now().isoformat()}\n---\n'
-    state_labels = {'draft': 'Quotation', 'sent': 'Sent', 'sale': 'Confirmed', 'done': 'Done', 'cancel': 'Cancelled'}
+    body = ''
     for o in orders:
         partner = o['partner_id'][1] if o['partner_id'] else 'N/A'
-        state = state_labels.get(o['state'], o['state'])
-        content += f'- **{o["name"]}** | {partner} | ${o["amount_total"]} | {state}\n'
-    (VAULT / 'Sales' / 'Orders.md').write_text(content)
+        state = odoo_sync.ORDER_STATES.get(o['state'], o['state'])
+        body += f'- **{o["name"]}** | {partner} | ${o["amount_total"]} | {state}\n'
+    return _write_snapshot(VAULT / 'Sales' / 'Orders.md', 'sales_update', body, 'orders')
 
 def write_inventory(products, moves):
-    content = f'---\ntype: inventory_update\ndate: {datetime.now().isoformat()}\n---\n'
-    content += '\n## Stock Levels\n'
+    body = '\n## Stock Levels\n'
     for p in products:
         code = p['default_code'] or ''
-        content += f'- **{p["name"]}** [{code}]: {p["qty_available"]} units (${p["list_price"]} each)\n'
+        body += f'- **{p["name"]}** [{code}]: {p["qty_available"]} units (${p["list_price"]} each)\n'
 
-    content += f'\n## Recent Stock Moves ({len(moves)})\n'
+    body += f'\n## Recent Stock Moves ({len(moves)})\n'
     for m in moves:
         product = m['product_id'][1] if m['product_id'] else '?'
         dest = m['location_dest_id'][1] if m['location_dest_id'] else '?'
-        content += f'- {m["date"]}: {product} x{m["quantity"]} → {dest}'
+        body += f'- {m["date"]}: {product} x{m["quantity"]} → {dest}'
         if m['origin']:
-            content += f' (from {m["origin"]})'
-        content += '\n'
-    (VAULT / 'Inventory' / 'Stock.md').write_text(content)
+            body += f' (from {m["origin"]})'
+        body += '\n'
+    return _write_snapshot(VAULT / 'Inventory' / 'Stock.md', 'inventory_update', body, 'inventory', 'stock_moves')
+
+def write_events(events):
+    """File one Needs_Action note listing the business events of a sync cycle."""
+    datasets = sorted({e['dataset'] for e in events})
+    content = (
+        f'---\n'
+        f'type: odoo_changes\n'
+        f'detected: {datetime.now().isoformat()}\n'
+        f'datasets: {", ".join(datasets)}\n'
+        f'count: {len(events)}\n'
+        f'events:\n'
+    )
+    for e in events:
+        content += f'  - {json.dumps({k: v for k, v in e.items() if k != "summary"}, default=str)}\n'
+    content += '---\n\n## Changes in Odoo\n'
+    for e in events:
+        content += f'- {e["summary"]}\n'
+    filepath = VAULT / 'Needs_Action' / f'ODOO_{datetime.now():%Y%m%d_%H%M%S}.md'
+    filepath.write_text(content)
+    return filepath
 
 # Ensure directories exist
-for d in ['Accounting', 'CRM', 'Sales', 'Inventory']:
+for d in ['Accounting', 'CRM', 'Sales', 'Inventory', 'Needs_Action']:
     (VAULT / d).mkdir(exist_ok=True)
 
-while True:
+_write_stock = lambda store: write_inventory(get_inventory(store), get_stock_moves(store))
+WRITERS = {
+    'transactions': lambda store: write_accounting(get_recent_transactions(store)),
+    'leads': lambda store: write_crm(get_crm_leads(store)),
+    'orders': lambda store: write_sales(get_sales_orders(store)),
+    'inventory': _write_stock,
+    'stock_moves': _write_stock,
+}
+
+def _sync_dataset(client, store, name, reconcile, page_size):
+    start = time.monotonic()
+    # The initial backfill merges the whole history; those are not events
+    backfilled = store.state(odoo_sync.DATASETS[name]['model']).get('backfilled_at')
+    changes = odoo_sync.sync(client, store, name, page_size)
+    if reconcile:
+        # Already-merged changes must still be reported if pruning fails
+        try:
+            changes += [(old, None) for old in odoo_sync.reconcile(client, store, name)]
+        except Exception as e:
+            print(f'[{datetime.now()}] {name} reconcile failed: {e}')
+    events = odoo_sync.change_events(name, changes) if backfilled else []
+    return bool(changes), events, time.monotonic() - start
+
+def _collect(name, future, changed, events):
+    """Record a finished dataset sync; adds the dataset to changed if its data moved."""
+    del _inflight[name]
     try:
-        uid, models = get_connection()
-
-        txns = get_recent_transactions(uid, models)
-        write_accounting(txns)
-        print(f'[{datetime.now()}] Accounting: {len(txns)} transactions')
-
-        leads = get_crm_leads(uid, models)
-        write_crm(leads)
-        print(f'[{datetime.now()}] CRM: {len(leads)} leads/opportunities')
-
-        orders = get_sales_orders(uid, models)
-        write_sales(orders)
-        print(f'[{datetime.now()}] Sales: {len(orders)} orders')
+        dataset_changed, dataset_events, latency = future.result()
+    except Exception as e:
+        print(f'[{datetime.now()}] {name} sync failed: {e}')
+        return
+    _latency[name] = latency
+    events += dataset_events
+    if dataset_changed:
+        changed.add(name)
+
+def sync_all(client, store, reconcile, timeout, page_size=odoo_sync.DEFAULT_PAGE_SIZE):
+    """Sync every dataset concurrently; returns the names whose data changed and their events.
+
+    A dataset that overruns the timeout keeps running in the background and
+    is collected on a later cycle instead of holding up the others.
+    """
+    changed = set()
+    events = []
+    for name, future in list(_inflight.items()):
+        if future.done():
+            _collect(name, future, changed, events)
+
+    submitted = {}
+    for name in odoo_sync.DATASETS:
+        if name in _inflight:
+            print(f'[{datetime.now()}] {name} sync still running from an earlier cycle')
+            continue
+        submitted[name] = _inflight[name] = _pool.submit(_sync_dataset, client, store, name, reconcile, page_size)
+
+    done, _ = wait(submitted.values(), timeout=timeout)
+    for name, future in submitted.items():
+        if future in done:
+            _collect(name, future, changed, events)
+        else:
+            print(f'[{datetime.now()}] {name} sync exceeded {timeout}s, will collect it next cycle')
+    return changed, events
+
+def _on_feed_change(model, ids):
+    # The next incremental sync fetches the records; the feed only says when to run it
+    _wake.set()
+
+store = odoo_sync.SyncStore()
+last_reconcile = 0
+first_cycle = True
+feed = odoo_feed.start(_on_feed_change, {spec['model'] for spec in odoo_sync.DATASETS.values()})
+if feed:
+    print(f'[{datetime.now()}] Odoo change feed enabled on {feed.channel}')
 
-        products = get_inventory(uid, models)
-        moves = get_stock_moves(uid, models)
-        write_inventory(products, moves)
-        print(f'[{datetime.now()}] Inventory: {len(products)} products, {len(moves)} moves')
+while True:
+    cfg = get_odoo_config()
+    cycle_start = time.monotonic()
+    # Cleared before syncing so a change announced mid-cycle triggers another one
+    _wake.clear()
+    try:
+        client = get_connection()
+        reconcile = time.time() - last_reconcile >= cfg.get('reconcile_interval', 3600)
+        changed, events = sync_all(client, store, reconcile, cfg.get('dataset_timeout', 30),
+                           cfg.get('page_size', odoo_sync.DEFAULT_PAGE_SIZE))
+        if reconcile:
+            last_reconcile = time.time()
+
+        # Only render snapshots whose data changed; unchanged renders are not rewritten either
+        writers = {WRITERS[name] for name in (odoo_sync.DATASETS if first_cycle else changed)}
+        written = sum(bool(write(store)) for write in writers)
+        if events:
+            filepath = write_events(events)
+            print(f'[{datetime.now()}] {len(events)} Odoo change event(s) saved to {filepath.name}')
+        if changed or first_cycle:
+            timings = ', '.join(f'{n} {_latency[n] * 1000:.0f}ms' for n in sorted(_latency))
+            print(f'[{datetime.now()}] Odoo sync: changed {", ".join(sorted(changed)) or "nothing"}, '
+                  f'{written} snapshot(s) rewritten ({timings})')
+        first_cycle = False
 
     except Exception as e:
         print(f'Error: {e}')
-    time.sleep(3600)
+    if _wake.wait(cfg.get('sync_interval', 60)):
+        # Let a burst of notifications settle into one sync, and keep feed-driven
+        # cycles at least min_sync_gap apart so a busy database is not polled back to back
+        feed_cfg = cfg.get('feed', {})
+        time.sleep(max(feed_cfg.get('coalesce', 2),
+                       cycle_start + feed_cfg.get('min_sync_gap', 10) - time.monotonic()))
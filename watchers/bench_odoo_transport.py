@@ -0,0 +1,59 @@
+"""Compare the XML-RPC and JSON-RPC Odoo transports on search_read throughput.
+
+Runs against a local stand-in server by default; pass --url to measure a
+real Odoo instead (database and credentials come from .env as usual).
+
+Usage:
+    python bench_odoo_transport.py [--rows 2000] [--calls 20] [--url http://localhost:8069]
+"""
+
+import argparse
+import time
+
+import odoo_utils
+from odoo_standin import StandInServer
+
+FIELDS = ['name', 'ref', 'partner_id', 'amount_total', 'amount_residual', 'state',
+          'payment_state', 'move_type', 'invoice_date', 'invoice_date_due', 'write_date']
+
+
+def bench(url, transport, rows, calls):
+    client = odoo_utils.OdooClient(url, odoo_utils.ODOO_DB, odoo_utils.ODOO_USER, odoo_utils.ODOO_PASS, transport)
+    client.authenticate()
+    # Warm-up call opens the keep-alive connection
+    client.execute_kw('account.move', 'search_read', [[]], {'fields': FIELDS, 'limit': rows})
+    fetched = 0
+    start = time.perf_counter()
+    for _ in range(calls):
+        fetched += len(client.execute_kw('account.move', 'search_read', [[]], {'fields': FIELDS, 'limit': rows}))
+    elapsed = time.perf_counter() - start
+    return fetched / elapsed, elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Odoo server to measure instead of the local stand-in')
+    parser.add_argument('--rows', type=int, default=2000, help='rows per search_read')
+    parser.add_argument('--calls', type=int, default=20, help='timed calls per transport')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = StandInServer(rows=args.rows).start()
+        url = server.url
+    try:
+        print(f'{args.calls} x search_read of {args.rows} rows against {url}')
+        results = {}
+        for transport in odoo_utils.TRANSPORTS:
+            rate, per_call = bench(url, transport, args.rows, args.calls)
+            results[transport] = rate
+            print(f'  {transport:8} {rate:10.0f} rows/s  {per_call * 1000:8.1f} ms/call')
+        print(f'  jsonrpc is {results["jsonrpc"] / results["xmlrpc"]:.1f}x xmlrpc')
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""Quota-aware, resumable bulk email sender.
+
+Each bulk send is a job persisted to bulk_jobs/<job_id>.json with a state per
+recipient (pending, sending, sent, failed). Sends run on a small thread pool
+throttled by a token bucket calibrated to Gmail's per-user quota units.
+
+Every message carries a deterministic Message-ID, so recipients left in the
+'sending' state by a crash are checked against the Sent folder on resume
+instead of being mailed twice. A job is only sent by the process holding
+the exclusive lock on bulk_jobs/<job_id>.lock, so an MCP server resuming
+jobs never races another session or a CLI run over the same recipients.
+"""
+
+import fcntl
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from googleapiclient.errors import HttpError
+
+import gmail_utils
+from config import get_gmail_config
+from gmail_watcher import get_service
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = Path(__file__).parent / 'bulk_jobs'
+
+# Gmail allows 250 quota units per user per second; messages.send costs 100
+SEND_COST = 100
+DEFAULT_QUOTA_UNITS_PER_SEC = 250
+DEFAULT_MAX_WORKERS = 4
+MAX_ATTEMPTS = 3
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until enough tokens exist."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return
+                wait = (cost - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _bulk_config():
+    return get_gmail_config().get('bulk', {})
+
+
+_quota_rate = _bulk_config().get('quota_units_per_sec', DEFAULT_QUOTA_UNITS_PER_SEC)
+# Shared by every job in the process so concurrent jobs cannot exceed the quota together
+_bucket = TokenBucket(_quota_rate, _quota_rate)
+_running = {}
+_running_lock = threading.Lock()
+
+
+class BulkJob:
+    def __init__(self, data):
+        self.data = data
+        self._lock = threading.Lock()
+        self._lock_file = None
+
+    @property
+    def id(self):
+        return self.data['id']
+
+    @property
+    def path(self):
+        return JOBS_DIR / f'{self.id}.json'
+
+    def acquire(self):
+        """Take the job's cross-process lock; False if another process holds it."""
+        JOBS_DIR.mkdir(exist_ok=True)
+        fh = open(JOBS_DIR / f'{self.id}.lock', 'a')
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fh.close()
+            return False
+        self._lock_file = fh
+        return True
+
+    def release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @classmethod
+    def create(cls, recipients, subject, body):
+        job_id = uuid.uuid4().hex[:12]
+        seen = {}
+        for email in recipients:
+            email = email.strip()
+            if email and email not in seen:
+                seen[email] = {
+                    'state': 'pending',
+                    'message_id': f'<bulk-{job_id}-{len(seen)}@ai-employee-vault>',
+                    'attempts': 0,
+                }
+        job = cls({
+            'id': job_id,
+            'subject': subject,
+            'body': body,
+            'status': 'running',
+            'created': datetime.now().isoformat(),
+            'recipients': seen,
+        })
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, job_id):
+        return cls(json.loads((JOBS_DIR / f'{job_id}.json').read_text()))
+
+    def save(self):
+        """Write the job file atomically; callers may hold self._lock."""
+        JOBS_DIR.mkdir(exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.data, indent=2))
+        tmp.replace(self.path)
+
+    def _update(self, email, **fields):
+        with self._lock:
+            self.data['recipients'][email].update(fields)
+            self.save()
+
+    def progress(self):
+        counts = {'pending': 0, 'sending': 0, 'sent': 0, 'failed': 0}
+        for r in self.data['recipients'].values():
+            counts[r['state']] += 1
+        return {
+            'id': self.id,
+            'status': self.data['status'],
+            'total': len(self.data['recipients']),
+            **counts,
+        }
+
+    def result(self):
+        """Summary in the shape send_bulk_email has always returned."""
+        recipients = self.data['recipients']
+        sent = [e for e, r in recipients.items() if r['state'] == 'sent']
+        failed = [
+            {'email': e, 'error': r.get('error', '')}
+            for e, r in recipients.items() if r['state'] == 'failed'
+        ]
+        return {'job_id': self.id, 'sent': sent, 'failed': failed, 'total': len(sent) + len(failed)}
+
+    def _already_sent(self, message_id):
+        """Check the Sent folder for a message left in flight by a previous run."""
+        resp = get_service().users().messages().list(
+            userId='me', q=f'in:sent rfc822msgid:{message_id}', maxResults=1,
+        ).execute()
+        return bool(resp.get('messages'))
+
+    def _send_one(self, email):
+        rec = self.data['recipients'][email]
+        if rec['state'] == 'sending':
+            try:
+                if self._already_sent(rec['message_id']):
+                    self._update(email, state='sent', sent_at=datetime.now().isoformat())
+                    return
+            except Exception as e:
+                logger.warning(f'Could not verify earlier send to {email}: {e}')
+
+        while True:
+            _bucket.acquire(SEND_COST)
+            self._update(email, state='sending', attempts=rec['attempts'] + 1)
+            try:
+                result = gmail_utils.send_email(
+                    email, self.data['subject'], self.data['body'],
+                    headers={'Message-ID': rec['message_id']},
+                )
+                self._update(email, state='sent', gmail_id=result['id'], sent_at=datetime.now().isoformat())
+                return
+            except HttpError as e:
+                if e.resp.status in RETRYABLE_STATUS and rec['attempts'] < MAX_ATTEMPTS:
+                    time.sleep(2 ** rec['attempts'])
+                    continue
+                self._update(email, state='failed', error=str(e))
+                logger.error(f'Bulk email failed for {email}: {e}')
+                return
+            except Exception as e:
+                self._update(email, state='failed', error=str(e))
+                logger.error(f'Bulk email failed for {email}: {e}')
+                return
+
+    def run(self):
+        """Send to every recipient that is not yet sent or failed; the caller holds the job lock."""
+        todo = [e for e, r in self.data['recipients'].items() if r['state'] in ('pending', 'sending')]
+        workers = _bulk_config().get('max_workers', DEFAULT_MAX_WORKERS)
+        logger.info(f'Bulk job {self.id}: {len(todo)} of {len(self.data["recipients"])} recipients to send')
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'bulk-{self.id}') as pool:
+            list(pool.map(self._send_one, todo))
+        with self._lock:
+            self.data['status'] = 'done'
+            self.data['finished'] = datetime.now().isoformat()
+            self.save()
+        p = self.progress()
+        logger.info(f'Bulk job {self.id} done: {p["sent"]} sent, {p["failed"]} failed')
+        return self.result()
+
+
+def _start_thread(job):
+    with _running_lock:
+        if job.id in _running:
+            return
+        thread = threading.Thread(target=_run_and_forget, args=(job,), name=f'bulk-{job.id}', daemon=True)
+        _running[job.id] = job
+    thread.start()
+
+
+def _run_and_forget(job):
+    try:
+        job.run()
+    except Exception as e:
+        logger.error(f'Bulk job {job.id} crashed: {e}')
+    finally:
+        job.release()
+        with _running_lock:
+            _running.pop(job.id, None)
+
+
+def start_job(recipients, subject, body):
+    """Create a bulk job and send it in the background. Returns the job."""
+    job = BulkJob.create(recipients, subject, body)
+    job.acquire()
+    _start_thread(job)
+    return job
+
+
+def run_job(recipients, subject, body):
+    """Create a bulk job and send it in the calling thread. Returns the result summary."""
+    job = BulkJob.create(recipients, subject, body)
+    job.acquire()
+    try:
+        return job.run()
+    finally:
+        job.release()
+
+
+def get_progress(job_id):
+    """Return progress counts for a job, live if it is running in this process."""
+    with _running_lock:
+        job = _running.get(job_id)
+    if job is not None:
+        with job._lock:
+            return job.progress()
+    return BulkJob.load(job_id).progress()
+
+
+def resume_jobs():
+    """Restart every unfinished job on disk that no other process is running.
+
+    Returns the resumed job IDs.
+    """
+    if not JOBS_DIR.exists():
+        return []
+    resumed = []
+    for path in sorted(JOBS_DIR.glob('*.json')):
+        job_id = path.stem
+        with _running_lock:
+            if job_id in _running:
+                continue
+        job = BulkJob({'id': job_id})
+        if not job.acquire():
+            logger.info(f'Bulk job {job_id} is running in another process, not resuming')
+            continue
+        # Read the file only under the lock; the previous holder may have finished it
+        try:
+            job.data = json.loads(path.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            job.release()
+            logger.error(f'Skipping unreadable bulk job {path.name}: {e}')
+            continue
+        if job.data['status'] == 'done':
+            job.release()
+            continue
+        _start_thread(job)
+        resumed.append(job.id)
+    if resumed:
+        logger.info(f'Resumed bulk jobs: {", ".join(resumed)}')
+    return resumed
@@ -19,11 +19,22 @@ DEFAULTS = {
         'filters': [
             {'name': 'important-unread', 'query': 'is:unread is:important', 'check_interval': 120}
         ],
+        'incremental_sync': True,
+        'thread_window': 120,
+        'bulk': {'max_workers': 4, 'quota_units_per_sec': 250},
     },
     'whatsapp': {
         'check_interval': 30,
+        'reconcile_interval': 300,
+        'outbox_interval': 5,
+        'lean_mode': True,
+        'blocked_resource_types': ['image', 'media', 'font'],
+        'max_rss_mb': 1500,
+        'memory_check_interval': 300,
+        'session_save_interval': 60,
         'default_keywords': ['urgent', 'asap', 'invoice', 'payment', 'help', 'price'],
         'contact_rules': [],
+        'accounts': [],
     },
     'social': {
         'facebook': {'max_message_length': 63206},
@@ -33,6 +44,28 @@ DEFAULTS = {
         'check_interval': 1800,
         'max_tweet_length': 280,
     },
+    'odoo': {
+        'transport': 'xmlrpc',
+        'sync_interval': 60,
+        'reconcile_interval': 3600,
+        'dataset_timeout': 30,
+        'page_size': 500,
+        'cache_ttls': {
+            'res.partner': 600,
+            'account.account': 3600,
+            'account.journal': 3600,
+            'crm.stage': 3600,
+        },
+        'negative_ttl': 60,
+        'feed': {
+            'enabled': False,
+            'url': '',
+            'channel': 'ai_employee_changes',
+            'poll_timeout': 50,
+            'coalesce': 2,
+            'min_sync_gap': 10,
+        },
+    },
 }
 
 
@@ -75,3 +108,8 @@ def get_social_config():
 def get_twitter_config():
     cfg = load_config()
     return cfg.get('twitter', DEFAULTS['twitter'])
+
+
+def get_odoo_config():
+    cfg = load_config()
+    return cfg.get('odoo', DEFAULTS['odoo'])
@@ -0,0 +1,132 @@
+"""Client-side evaluation of simple Gmail search queries.
+
+GmailWatcher merges filters that are due in the same tick into one OR'ed
+messages.list call, then routes each returned message back to the filters it
+matched using the predicates compiled here. Only operators that can be
+answered from a message's labelIds and From/To/Subject headers are
+supported; compile_query returns None for anything else, and such filters
+keep their own messages.list call. from: and to: are only compiled for
+email addresses and domains: Gmail also matches display names and aliases
+such as "me", which a local check cannot reproduce.
+"""
+
+import shlex
+from email.utils import getaddresses
+
+IS_LABELS = {
+    'unread': 'UNREAD',
+    'important': 'IMPORTANT',
+    'starred': 'STARRED',
+}
+IN_LABELS = {
+    'inbox': 'INBOX',
+    'sent': 'SENT',
+    'spam': 'SPAM',
+    'trash': 'TRASH',
+    'draft': 'DRAFT',
+}
+CATEGORY_LABELS = {
+    'primary': 'CATEGORY_PERSONAL',
+    'social': 'CATEGORY_SOCIAL',
+    'promotions': 'CATEGORY_PROMOTIONS',
+    'updates': 'CATEGORY_UPDATES',
+    'forums': 'CATEGORY_FORUMS',
+}
+HEADER_OPS = {'from': 'From', 'to': 'To', 'subject': 'Subject'}
+# Headers whose addresses each address operator searches; Gmail's to: covers Cc too
+ADDRESS_OPS = {'from': ('From',), 'to': ('To', 'Cc')}
+
+
+def message_facts(msg):
+    """Extract the fields predicates look at from a metadata-format message."""
+    headers = {h['name']: h['value'] for h in msg.get('payload', {}).get('headers', [])}
+    facts = {name: headers.get(name, '').lower() for name in HEADER_OPS.values()}
+    facts['labels'] = set(msg.get('labelIds', []))
+    for op, names in ADDRESS_OPS.items():
+        facts[op] = {addr.lower() for _, addr in getaddresses([headers.get(n, '') for n in names]) if addr}
+    return facts
+
+
+def _has_label(label_id):
+    return lambda facts: label_id in facts['labels']
+
+
+def _header_contains(header, needle):
+    needle = needle.lower()
+    return lambda facts: needle in facts[header]
+
+
+def _address_matches(op, value):
+    """Match an address (bob@x.com) or a domain (x.com, @x.com) against op's addresses."""
+    value = value.lower()
+    if '@' in value[1:]:
+        return lambda facts: value in facts[op]
+    domain = value.lstrip('@')
+    return lambda facts: any(a.endswith('@' + domain) or a.endswith('.' + domain) for a in facts[op])
+
+
+def _compile_term(term, resolve_label):
+    negate = term.startswith('-')
+    if negate:
+        term = term[1:]
+    op, sep, value = term.partition(':')
+    if not sep or not value:
+        return None
+    op, value = op.lower(), value.strip()
+
+    if op == 'is' and value.lower() == 'read':
+        pred, negate = _has_label('UNREAD'), not negate
+    elif op == 'is' and value.lower() in IS_LABELS:
+        pred = _has_label(IS_LABELS[value.lower()])
+    elif op == 'in' and value.lower() in IN_LABELS:
+        pred = _has_label(IN_LABELS[value.lower()])
+    elif op == 'category' and value.lower() in CATEGORY_LABELS:
+        pred = _has_label(CATEGORY_LABELS[value.lower()])
+    elif op == 'label':
+        label_id = resolve_label(value)
+        if label_id is None:
+            return None
+        pred = _has_label(label_id)
+    elif op in ADDRESS_OPS:
+        # Names and aliases ("me") are matched by Gmail in ways we cannot check locally
+        if '.' not in value or any(c in value for c in ' *"'):
+            return None
+        pred = _address_matches(op, value)
+    elif op in HEADER_OPS:
+        pred = _header_contains(HEADER_OPS[op], value)
+    else:
+        return None
+
+    if negate:
+        return lambda facts, p=pred: not p(facts)
+    return pred
+
+
+def compile_query(query, resolve_label=lambda name: None):
+    """Compile a Gmail query into a predicate over message_facts().
+
+    resolve_label maps a label name as written in the query to a label ID.
+    Returns None if the query uses anything that cannot be evaluated locally
+    (free text, OR, grouping, date or attachment operators, ...).
+    """
+    try:
+        terms = shlex.split(query)
+    except ValueError:
+        return None
+    if not terms or any(t.upper() == 'OR' or t[:1] in '({' for t in terms):
+        return None
+
+    preds = []
+    for term in terms:
+        pred = _compile_term(term, resolve_label)
+        if pred is None:
+            return None
+        preds.append(pred)
+    return lambda facts: all(p(facts) for p in preds)
+
+
+def merge_queries(queries):
+    """Combine several queries into one that matches any of them."""
+    if len(queries) == 1:
+        return queries[0]
+    return ' OR '.join(f'({q})' for q in queries)
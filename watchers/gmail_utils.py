@@ -1,16 +1,21 @@
-import base64, logging, sys, time
+import base64, logging, sys
 from email.mime.text import MIMEText
 from gmail_watcher import get_service
 
 logger = logging.getLogger(__name__)
 
 
-def send_email(to, subject, body):
-    """Compose and send a new email."""
+def send_email(to, subject, body, headers=None):
+    """Compose and send a new email.
+
+    headers: optional dict of extra MIME headers (e.g. a fixed Message-ID).
+    """
     service = get_service()
     message = MIMEText(body)
     message['to'] = to
     message['subject'] = subject
+    for name, value in (headers or {}).items():
+        message[name] = value
     raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
     result = service.users().messages().send(
         userId='me', body={'raw': raw}
@@ -51,34 +56,46 @@ def reply_to_email(message_id, body):
     return result
 
 
-def send_bulk_email(recipients, subject, body, delay=2):
-    """Send the same email to multiple recipients with a delay between each.
+def _extract_text(payload):
+    """Return the first text/plain part of a message payload, decoded."""
+    if payload.get('mimeType') == 'text/plain' and payload.get('body', {}).get('data'):
+        return base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='replace')
+    for part in payload.get('parts', []):
+        text = _extract_text(part)
+        if text:
+            return text
+    return ''
+
+
+def get_message_body(message_id):
+    """Fetch the plain-text body of a message.
+
+    The watcher only downloads headers and snippets; call this when a
+    downstream step actually needs the full text.
+    """
+    service = get_service()
+    msg = service.users().messages().get(
+        userId='me', id=message_id, format='full', fields='id,payload',
+    ).execute()
+    return _extract_text(msg.get('payload', {}))
+
+
+def send_bulk_email(recipients, subject, body):
+    """Send the same email to multiple recipients and wait for completion.
+
+    Sends run concurrently under a Gmail quota-aware rate limiter and are
+    tracked in a resumable job file; see bulk_email.py.
 
     Args:
         recipients: List of email addresses.
         subject: Email subject line.
         body: Email body text.
-        delay: Seconds to wait between sends (default 2) to avoid rate limits.
 
     Returns:
-        Dict with 'sent', 'failed' lists and 'total' count.
+        Dict with 'job_id', 'sent', 'failed' lists and 'total' count.
     """
-    sent = []
-    failed = []
-    for i, to in enumerate(recipients):
-        to = to.strip()
-        if not to:
-            continue
-        try:
-            send_email(to, subject, body)
-            sent.append(to)
-            logger.info(f'Bulk email {i+1}/{len(recipients)} sent to {to}')
-        except Exception as e:
-            failed.append({"email": to, "error": str(e)})
-            logger.error(f'Bulk email failed for {to}: {e}')
-        if i < len(recipients) - 1:
-            time.sleep(delay)
-    return {"sent": sent, "failed": failed, "total": len(sent) + len(failed)}
+    import bulk_email
+    return bulk_email.run_job(recipients, subject, body)
 
 
 if __name__ == '__main__':
@@ -1,12 +1,15 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 from base_watcher import BaseWatcher
 from config import get_gmail_config
+from gmail_query import compile_query, merge_queries, message_facts
+from token_manager import TokenManager
 from pathlib import Path
 from datetime import datetime
-import json, logging, time
+from email.utils import formataddr, getaddresses
+import httplib2, json, logging, re, threading, time
 
 logging.basicConfig(level=logging.INFO)
 
@@ -17,49 +20,158 @@ SCOPES = [
 WATCHER_DIR = Path(__file__).parent
 CLIENT_SECRET = WATCHER_DIR / 'client_secret_1096764676267-8dcb5r2q96s3hlof2rdfttd90h6nhd6b.apps.googleusercontent.com.json'
 TOKEN_FILE = WATCHER_DIR / 'gmail_token.json'
+HISTORY_FILE = WATCHER_DIR / 'gmail_history.json'
+# Messages waiting for their thread window to close; survives restarts
+THREADS_FILE = WATCHER_DIR / 'gmail_threads.json'
 
+# Gmail caps batch requests at 100 calls
+BATCH_SIZE = 100
+LIST_PAGE_SIZE = 500  # messages.list maximum
+METADATA_HEADERS = ['From', 'To', 'Cc', 'Subject']
+METADATA_FIELDS = 'id,threadId,labelIds,snippet,internalDate,payload/headers'
+HTTP_TIMEOUT = 60
 
-def _token_scopes_match(token_path, required_scopes):
-    """Check if saved token has all required scopes."""
-    try:
-        data = json.loads(token_path.read_text())
-        saved = set(data.get('scopes', []))
-        return set(required_scopes).issubset(saved)
-    except Exception:
-        return False
-
-
-def get_service():
-    creds = None
-    if TOKEN_FILE.exists():
-        if not _token_scopes_match(TOKEN_FILE, SCOPES):
-            logging.info('Token scopes changed, re-authenticating...')
-            TOKEN_FILE.unlink()
-        else:
-            creds = Credentials.from_authorized_user_file(str(TOKEN_FILE), SCOPES)
-
-    if creds and creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
-            TOKEN_FILE.write_text(creds.to_json())
-        except Exception as e:
-            logging.error(f'Token refresh failed: {e}')
-            creds = None
-
-    if not creds or not creds.valid:
-        # In interactive mode, run the OAuth flow; in PM2 just fail clearly
-        import sys
-        if not sys.stdin.isatty():
-            logging.error(
-                'Gmail token is missing or expired and cannot re-authenticate in headless mode. '
-                'Run manually: cd watchers && .venv/bin/python gmail_watcher.py'
+# Process-wide service cache, shared by the watcher, gmail_utils and the MCP server
+token_manager = TokenManager(TOKEN_FILE, CLIENT_SECRET, SCOPES)
+_service = None
+_service_lock = threading.Lock()
+_local = threading.local()
+
+
+def _thread_http():
+    """Return this thread's authorized Http, creating it on first use.
+
+    httplib2.Http is not thread-safe, so every thread gets its own connection
+    pool. The token manager hands back the same credentials object until the
+    token file is rewritten by another process, at which point the Http is
+    rebuilt around the new credentials.
+    """
+    creds = token_manager.get_credentials()
+    http = getattr(_local, 'http', None)
+    if http is None or http.credentials is not creds:
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        _local.http = http
+    return http
+
+
+def _build_request(http, *args, **kwargs):
+    return HttpRequest(_thread_http(), *args, **kwargs)
+
+
+def get_service(refresh=False):
+    """Return the process-wide Gmail service, building it on first use.
+
+    The service is built once from the bundled static discovery document and
+    shared across threads; pass refresh=True to force a token refresh after
+    an auth error.
+    """
+    global _service
+    with _service_lock:
+        if refresh:
+            token_manager.refresh(force=True)
+        if _service is None:
+            creds = token_manager.get_credentials()
+            token_manager.start()
+            _service = build(
+                'gmail', 'v1', credentials=creds,
+                static_discovery=True, cache_discovery=False,
+                requestBuilder=_build_request,
             )
-            raise SystemExit(1)
-        flow = InstalledAppFlow.from_client_secrets_file(str(CLIENT_SECRET), SCOPES)
-        creds = flow.run_local_server(port=8090, open_browser=False)
-        TOKEN_FILE.write_text(creds.to_json())
+        return _service
+
+
+def _load_history_state():
+    """Return the saved history cursor state, or {} if never synced."""
+    try:
+        return json.loads(HISTORY_FILE.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
 
-    return build('gmail', 'v1', credentials=creds)
+def _save_history_state(history_id, pending, needs_full):
+    """Persist the historyId with the IDs it has already handed out, atomically.
+
+    The cursor and the pending IDs must be saved together: once the cursor
+    moves past a change, history.list never reports that message again.
+    """
+    tmp = HISTORY_FILE.with_suffix('.tmp')
+    tmp.write_text(json.dumps({
+        'history_id': str(history_id),
+        'pending': {name: sorted(ids) for name, ids in pending.items() if ids},
+        'needs_full': sorted(needs_full),
+        'updated': datetime.now().isoformat(),
+    }))
+    tmp.replace(HISTORY_FILE)
+
+
+def _load_threads():
+    try:
+        return json.loads(THREADS_FILE.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_threads(threads):
+    tmp = THREADS_FILE.with_suffix('.tmp')
+    tmp.write_text(json.dumps(threads))
+    tmp.replace(THREADS_FILE)
+
+
+def _headers(msg):
+    return {h['name']: h['value'] for h in msg.get('payload', {}).get('headers', [])}
+
+
+def _participants(messages):
+    """Distinct From/To/Cc addresses across messages, in first-seen order."""
+    seen = []
+    for msg in messages:
+        headers = _headers(msg)
+        for name in ('From', 'To', 'Cc'):
+            for addr in getaddresses([headers.get(name, '')]):
+                formatted = formataddr(addr) if addr[1] else ''
+                if formatted and formatted not in seen:
+                    seen.append(formatted)
+    return seen
+
+
+def _thread_item(thread_id, messages):
+    """Collapse a thread's new messages into one item carrying the latest message."""
+    messages = sorted(messages, key=lambda m: int(m.get('internalDate', 0)))
+    filters = []
+    for msg in messages:
+        filters.extend(n for n in msg.get('_filter_names', []) if n not in filters)
+    return {
+        'thread_id': thread_id,
+        'latest': messages[-1],
+        'message_ids': [m['id'] for m in messages],
+        'participants': _participants(messages),
+        'filters': filters,
+    }
+
+
+def _read_frontmatter(path):
+    """Parse the key: value lines of a markdown file's frontmatter."""
+    meta = {}
+    # Only a line that is exactly --- delimits it; subjects and snippets may contain ---
+    parts = re.split(r'^---$', path.read_text(), maxsplit=2, flags=re.MULTILINE)
+    if len(parts) < 3:
+        return meta
+    for line in parts[1].strip().splitlines():
+        if ':' in line:
+            key, val = line.split(':', 1)
+            meta[key.strip()] = val.strip()
+    return meta
+
+
+def _merge_filters(path, names):
+    """Add filter names to the filter: line of an action file's frontmatter."""
+    meta = _read_frontmatter(path)
+    filters = [f for f in meta.get('filter', '').split(', ') if f and f != 'unknown']
+    added = [n for n in names if n not in filters]
+    if not added:
+        return
+    line = f'filter: {", ".join(filters + added)}'
+    path.write_text(re.sub(r'^filter:.*$', lambda _: line, path.read_text(), count=1, flags=re.MULTILINE))
 
 
 class GmailWatcher(BaseWatcher):
@@ -68,81 +180,340 @@ class GmailWatcher(BaseWatcher):
         self.filters = cfg.get('filters', [
             {'name': 'important-unread', 'query': 'is:unread is:important', 'check_interval': 120}
         ])
+        self.incremental = cfg.get('incremental_sync', True)
+        self.thread_window = cfg.get('thread_window', 120)
         # Use the shortest filter interval as the main loop interval
         min_interval = min(f.get('check_interval', 120) for f in self.filters)
         super().__init__(vault_path, min_interval)
         self.service = get_service()
-        self.processed = set()
+        # message id -> names of the filters it has been checked against
+        self.processed = {}
         self._filter_last_checked = {}
+        state = _load_history_state() if self.incremental else {}
+        self._history_id = state.get('history_id')
+        # Message IDs reported by history.list that each filter has not looked at yet
+        self._pending = {f['name']: set(state.get('pending', {}).get(f['name'], ())) for f in self.filters}
+        # Filters that must run a full messages.list (populated on cursor reset)
+        self._needs_full = set(state.get('needs_full', ())) & set(self._pending)
+        self._cursor_dirty = False
+        self._label_ids = None
+        self._threads = _load_threads()
+
+    def _reset_history_cursor(self):
+        """Start a fresh history cursor and schedule a full list for every filter."""
+        profile = self.service.users().getProfile(userId='me').execute()
+        self._history_id = profile['historyId']
+        self._needs_full = {f['name'] for f in self.filters}
+        self._cursor_dirty = True
+
+    def _sync_history(self):
+        """Fetch IDs of messages added or relabelled since the stored historyId.
+
+        When there is no cursor yet, or Gmail has expired the stored historyId,
+        the cursor is reset and every filter falls back to a full list.
+        """
+        if not self._history_id:
+            self._reset_history_cursor()
+            return set()
+
+        changed = set()
+        page_token = None
+        latest = self._history_id
+        try:
+            while True:
+                resp = self.service.users().history().list(
+                    userId='me', startHistoryId=self._history_id,
+                    historyTypes=['messageAdded', 'labelAdded'],
+                    pageToken=page_token,
+                ).execute()
+                for record in resp.get('history', []):
+                    for item in record.get('messagesAdded', []) + record.get('labelsAdded', []):
+                        changed.add(item['message']['id'])
+                latest = resp.get('historyId', latest)
+                page_token = resp.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            self.logger.warning(f'History ID {self._history_id} expired, falling back to full sync')
+            self._reset_history_cursor()
+            return set()
+
+        if latest != self._history_id:
+            self._history_id = latest
+            self._cursor_dirty = True
+        return changed
 
     def check_for_updates(self):
+        """Return one item per thread whose aggregation window has closed."""
+        now = time.time()
+        new_messages = self._poll_messages()
+        for msg in new_messages:
+            thread = self._threads.setdefault(msg.get('threadId', msg['id']), {'first_seen': now, 'messages': []})
+            thread['messages'].append(msg)
+
+        ready = [tid for tid, t in self._threads.items() if now - t['first_seen'] >= self.thread_window]
+        items = [_thread_item(tid, self._threads.pop(tid)['messages']) for tid in ready]
+        if new_messages or ready:
+            _save_threads(self._threads)
+        # Only move the cursor once what it covered is on disk; a crash before
+        # this point replays the same history instead of losing it
+        if self._cursor_dirty:
+            _save_history_state(self._history_id, self._pending, self._needs_full)
+            self._cursor_dirty = False
+        return items
+
+    def _poll_messages(self):
+        """Fetch metadata for messages that newly match any due filter."""
         now = time.time()
         new_messages = []
 
-        for filt in self.filters:
-            name = filt['name']
-            interval = filt.get('check_interval', 120)
-            last = self._filter_last_checked.get(name, 0)
+        due = [
+            f for f in self.filters
+            if now - self._filter_last_checked.get(f['name'], 0) >= f.get('check_interval', 120)
+        ]
+        if not due:
+            return new_messages
 
-            if now - last < interval:
-                continue
+        if self.incremental:
+            try:
+                changed = self._sync_history()
+            except Exception as e:
+                self.logger.error(f'History sync failed: {e}')
+                self._refresh_service_on_auth_error(e)
+                return new_messages
+            for pending in self._pending.values():
+                pending.update(changed)
 
+        active = []
+        for filt in due:
+            name = filt['name']
             self._filter_last_checked[name] = now
-            query = filt['query']
+            if self.incremental and name not in self._needs_full and not self._pending.get(name):
+                continue
+            active.append(filt)
+        if not active:
+            return new_messages
 
+        # msg_id -> [(eligible filter names, matchers)] for each query that returned it
+        routes = {}
+        for group, matchers in self._plan(active):
+            names = [f['name'] for f in group]
+            # None means the filter accepts any listed message (full list)
+            accept = {
+                n: None if not self.incremental or n in self._needs_full else set(self._pending.get(n, ()))
+                for n in names
+            }
+            query = merge_queries([f['query'] for f in group])
             try:
-                results = self.service.users().messages().list(
-                    userId='me', q=query
-                ).execute()
+                listed = self._list_messages(query)
             except Exception as e:
-                self.logger.error(f'Filter "{name}" query failed: {e}')
-                # Try refreshing the service on auth errors
-                if 'invalid_grant' in str(e).lower() or '401' in str(e):
-                    try:
-                        self.service = get_service()
-                        self.logger.info('Refreshed Gmail service after auth error')
-                    except Exception:
-                        pass
+                self.logger.error(f'Filter(s) {", ".join(names)} query failed: {e}')
+                self._refresh_service_on_auth_error(e)
                 continue
+            for n in names:
+                self._pending[n] = set()
+                self._needs_full.discard(n)
+            self._cursor_dirty = True
+
+            for msg in listed:
+                eligible = [n for n in names if accept[n] is None or msg['id'] in accept[n]]
+                # Skip messages already checked against every filter that could claim them
+                if set(eligible) - self.processed.get(msg['id'], set()):
+                    routes.setdefault(msg['id'], []).append((eligible, matchers))
 
-            for msg in results.get('messages', []):
-                msg_key = (msg['id'], name)
-                if msg_key in self.processed:
-                    continue
-                try:
-                    full = self.service.users().messages().get(
-                        userId='me', id=msg['id']
-                    ).execute()
-                    full['_filter_name'] = name
-                    new_messages.append(full)
-                    self.processed.add(msg_key)
-                except Exception as e:
-                    self.logger.error(f'Failed to fetch message {msg["id"]}: {e}')
+        fetched = self._fetch_metadata(routes)
+        for msg_id, candidates in routes.items():
+            if msg_id not in fetched:
+                # Hand the ID back so the next poll retries it; history.list
+                # will not report it again
+                if self.incremental:
+                    for eligible, _ in candidates:
+                        for n in eligible:
+                            self._pending[n].add(msg_id)
+                continue
+            msg = fetched[msg_id]
+            facts = message_facts(msg)
+            matched = []
+            checked = self.processed.get(msg_id, set())
+            for eligible, matchers in candidates:
+                hits = [n for n in eligible if matchers is None or matchers[n](facts)]
+                # Gmail matched the OR'ed query, so fall back to the whole group
+                # if the local predicates disagree with Gmail's semantics
+                matched.extend(hits or eligible)
+            names = [f['name'] for f in self.filters if f['name'] in matched and f['name'] not in checked]
+            reported = msg_id in self.processed
+            self.processed.setdefault(msg_id, set()).update(n for eligible, _ in candidates for n in eligible)
+            if not names:
+                continue
+            if reported:
+                # Reported earlier under other filters; add the new tags instead of dropping them
+                self._add_filters(msg, names)
+            else:
+                new_messages.append({**msg, '_filter_names': names})
 
         return new_messages
 
-    def create_action_file(self, msg):
-        headers = {h['name']: h['value'] for h in msg['payload']['headers']}
-        filter_name = msg.get('_filter_name', 'unknown')
+    def _list_messages(self, query):
+        """Every message matching query, following nextPageToken."""
+        messages = []
+        page_token = None
+        while True:
+            resp = self.service.users().messages().list(
+                userId='me', q=query, maxResults=LIST_PAGE_SIZE, pageToken=page_token
+            ).execute()
+            messages.extend(resp.get('messages', []))
+            page_token = resp.get('nextPageToken')
+            if not page_token:
+                return messages
+
+    def _add_filters(self, msg, names):
+        """Tag an already reported message with more filters, wherever it is now."""
+        thread_id = msg.get('threadId', msg['id'])
+        thread = self._threads.get(thread_id)
+        if thread is not None:
+            for buffered in thread['messages']:
+                if buffered['id'] == msg['id']:
+                    buffered['_filter_names'] += [n for n in names if n not in buffered['_filter_names']]
+            _save_threads(self._threads)
+            return
+        for filepath in self._thread_files(thread_id):
+            _merge_filters(filepath, names)
+
+    def _plan(self, filters):
+        """Split due filters into query groups.
+
+        Filters whose queries can be evaluated locally are merged into a single
+        OR'ed query and routed by their compiled predicates; every other filter
+        gets its own query. Yields (filters, matchers) pairs where matchers is
+        None for single-filter groups.
+        """
+        mergeable, matchers = [], {}
+        for filt in filters:
+            pred = compile_query(filt['query'], self._resolve_label)
+            if pred is None:
+                yield [filt], None
+            else:
+                mergeable.append(filt)
+                matchers[filt['name']] = pred
+        if len(mergeable) == 1:
+            yield mergeable, None
+        elif mergeable:
+            yield mergeable, matchers
+
+    def _resolve_label(self, name):
+        """Map a label name as written in a query (e.g. 'my-label') to its label ID."""
+        if self._label_ids is None:
+            try:
+                labels = self.service.users().labels().list(userId='me').execute().get('labels', [])
+            except Exception as e:
+                self.logger.warning(f'Could not list labels for query planning: {e}')
+                return None
+            self._label_ids = {}
+            for label in labels:
+                self._label_ids[label['name'].lower().replace(' ', '-')] = label['id']
+                self._label_ids[label['id'].lower()] = label['id']
+        return self._label_ids.get(name.lower().replace(' ', '-'))
+
+    def _fetch_metadata(self, message_ids):
+        """Fetch headers and snippet for many messages using Gmail batch requests.
+
+        Only the headers used by create_action_file are requested; bodies are
+        fetched on demand via gmail_utils.get_message_body.
+        Returns a dict of message id -> message resource.
+        """
+        fetched = {}
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                self.logger.error(f'Failed to fetch message {request_id}: {exception}')
+            else:
+                fetched[request_id] = response
+
+        ids = sorted(message_ids)
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for msg_id in ids[i:i + BATCH_SIZE]:
+                batch.add(
+                    self.service.users().messages().get(
+                        userId='me', id=msg_id, format='metadata',
+                        metadataHeaders=METADATA_HEADERS, fields=METADATA_FIELDS,
+                    ),
+                    request_id=msg_id,
+                )
+            try:
+                batch.execute()
+            except Exception as e:
+                self.logger.error(f'Batch fetch of {len(ids[i:i + BATCH_SIZE])} messages failed: {e}')
+        return fetched
+
+    def _refresh_service_on_auth_error(self, e):
+        """Rebuild the Gmail service when an API call failed on auth."""
+        if 'invalid_grant' in str(e).lower() or '401' in str(e):
+            try:
+                self.service = get_service(refresh=True)
+                self.logger.info('Refreshed Gmail service after auth error')
+            except Exception:
+                pass
+
+    def _thread_files(self, thread_id):
+        """The thread's items still waiting in Needs_Action."""
+        return sorted(self.needs_action.glob(f'EMAIL_{thread_id}_*.md'))
+
+    def create_action_file(self, item):
+        """Write the thread's Needs_Action file as EMAIL_<thread>_<latest message>.md.
+
+        If an earlier item for the same thread has not been classified yet,
+        it is folded into the new file so the orchestrator sees one item per
+        thread. Every item gets its own name, so a thread's later messages
+        never overwrite an earlier item already moved to Done or
+        Pending_Approval, or look already drafted to the cloud orchestrator.
+        """
+        latest = item['latest']
+        headers = _headers(latest)
+        filepath = self.needs_action / f'EMAIL_{item["thread_id"]}_{latest["id"]}.md'
+
+        participants = list(item['participants'])
+        filters = list(item['filters'])
+        count = len(item['message_ids'])
+        earlier = [p for p in self._thread_files(item['thread_id']) if p != filepath]
+        for path in earlier:
+            meta = _read_frontmatter(path)
+            count += int(meta.get('message_count', 1))
+            for p in meta.get('participants', '').split('; '):
+                if p and p not in participants:
+                    participants.append(p)
+            for f in meta.get('filter', '').split(', '):
+                if f and f != 'unknown' and f not in filters:
+                    filters.append(f)
+
+        filter_name = ', '.join(filters) or 'unknown'
         content = (
             f'---\n'
             f'type: email\n'
             f'from: {headers.get("From")}\n'
             f'subject: {headers.get("Subject")}\n'
             f'received: {datetime.now().isoformat()}\n'
-            f'message_id: {msg["id"]}\n'
+            f'message_id: {latest["id"]}\n'
+            f'thread_id: {item["thread_id"]}\n'
+            f'message_count: {count}\n'
+            f'participants: {"; ".join(participants)}\n'
             f'filter: {filter_name}\n'
             f'---\n\n'
-            f'## Snippet\n{msg.get("snippet", "")}\n'
+            f'## Snippet\n{latest.get("snippet", "")}\n'
         )
-        filepath = self.needs_action / f'EMAIL_{msg["id"]}.md'
         filepath.write_text(content)
-        self.logger.info(f'[{filter_name}] New email: {headers.get("Subject")}')
+        for path in earlier:
+            path.unlink(missing_ok=True)
+        self.logger.info(f'[{filter_name}] New email ({count} in thread): {headers.get("Subject")}')
 
-    def get_notification_text(self, msg):
-        headers = {h['name']: h['value'] for h in msg['payload']['headers']}
-        title = f'New Email [{msg.get("_filter_name", "")}]'
+    def get_notification_text(self, item):
+        headers = _headers(item['latest'])
+        title = f'New Email [{", ".join(item["filters"])}]'
         body = f'From: {headers.get("From", "?")}\n{headers.get("Subject", "(no subject)")}'
+        if len(item['message_ids']) > 1:
+            body += f'\n({len(item["message_ids"])} new messages in thread)'
         return title, body
 
 
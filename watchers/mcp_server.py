@@ -9,8 +9,10 @@ sys.path.insert(0, str(Path(__file__).parent))
 from mcp.server.fastmcp import FastMCP
 
 import gmail_utils
+import bulk_email
 import whatsapp_utils
 import odoo_utils
+import odoo_feed
 import social_utils
 import twitter_utils
 import audit_logger
@@ -34,7 +36,10 @@ def send_email(to: str, subject: str, body: str) -> str:
 
 @mcp.tool()
 def send_bulk_email(recipients: str, subject: str, body: str) -> str:
-    """Send the same email to multiple recipients.
+    """Send the same email to multiple recipients in the background.
+
+    Returns a job ID immediately; use bulk_email_status to follow progress.
+    Jobs survive restarts and resume where they left off.
 
     Args:
         recipients: Comma-separated list of email addresses (e.g. "a@x.com,b@x.com")
@@ -42,16 +47,27 @@ def send_bulk_email(recipients: str, subject: str, body: str) -> str:
         body: Email body text
     """
     recipient_list = [e.strip() for e in recipients.split(',') if e.strip()]
-    result = gmail_utils.send_bulk_email(recipient_list, subject, body)
+    job = bulk_email.start_job(recipient_list, subject, body)
+    progress = bulk_email.get_progress(job.id)
     audit_logger.log_action(
-        "send_bulk_email", "mcp_server", f"{len(recipient_list)} recipients",
-        {"subject": subject, "sent": len(result["sent"]), "failed": len(result["failed"])},
-        "manual", "success"
+        "send_bulk_email", "mcp_server", f"{progress['total']} recipients",
+        {"subject": subject, "job_id": job.id}, "manual", "queued"
+    )
+    return f"Bulk email job {job.id} started: {progress['total']} recipients queued"
+
+
+@mcp.tool()
+def bulk_email_status(job_id: str) -> str:
+    """Report progress of a bulk email job.
+
+    Args:
+        job_id: Job ID returned by send_bulk_email
+    """
+    p = bulk_email.get_progress(job_id)
+    return (
+        f"Bulk email job {p['id']} ({p['status']}): {p['sent']} sent, {p['failed']} failed, "
+        f"{p['pending'] + p['sending']} remaining out of {p['total']}"
     )
-    summary = f"Bulk email: {len(result['sent'])} sent, {len(result['failed'])} failed out of {result['total']}"
-    if result['failed']:
-        summary += "\nFailed: " + ", ".join(f["email"] for f in result["failed"])
-    return summary
 
 
 @mcp.tool()
@@ -68,18 +84,52 @@ def reply_to_email(message_id: str, body: str) -> str:
 
 
 @mcp.tool()
-def send_whatsapp(contact: str, message: str) -> str:
+def read_email(message_id: str) -> str:
+    """Fetch the plain-text body of a Gmail message.
+
+    Args:
+        message_id: The Gmail message ID (as in the message_id field of EMAIL_*.md files)
+    """
+    return gmail_utils.get_message_body(message_id) or "(no plain-text body)"
+
+
+@mcp.tool()
+def send_whatsapp(contact: str, message: str, priority: int = 0, account: str = "") -> str:
     """Send a WhatsApp message via the outbox queue.
 
-    The wa-watcher process picks up queued messages and delivers them.
+    The wa-watcher process picks up queued messages and delivers them,
+    retrying failures with backoff.
 
     Args:
         contact: Contact name as it appears in WhatsApp
         message: Message text to send
+        priority: Higher values are sent first (default 0)
+        account: WhatsApp account to send from (as in the account field of WHATSAPP_*.md files); defaults to the primary account
     """
-    filepath = whatsapp_utils.send_message(contact, message)
+    msg_id = whatsapp_utils.send_message(contact, message, priority, account or None)
     audit_logger.log_action("send_whatsapp", "mcp_server", contact, {"message": message[:100]}, "manual", "success")
-    return f"WhatsApp message queued: {filepath.name}"
+    return f"WhatsApp message queued: id={msg_id}"
+
+
+@mcp.tool()
+def whatsapp_failed_messages(limit: int = 20) -> str:
+    """List queued WhatsApp messages that were not delivered.
+
+    'dead' messages failed every retry; 'unconfirmed' ones were submitted but
+    delivery was never confirmed, so check the chat before re-sending them.
+
+    Args:
+        limit: Maximum number of messages to list, newest first (default 20)
+    """
+    rows = whatsapp_utils.dead_letters(limit)
+    if not rows:
+        return "No dead or unconfirmed WhatsApp messages"
+    lines = [
+        f"id={r['id']} [{r['status']}] {r['account']} -> {r['contact']}: {r['message'][:80]} "
+        f"(error: {r['last_error']})"
+        for r in rows
+    ]
+    return "\n".join(lines)
 
 
 @mcp.tool()
@@ -139,6 +189,52 @@ def update_crm_stage(lead_name: str, stage_name: str) -> str:
     return f"CRM updated: {result['name']} → {result['stage']}"
 
 
+@mcp.tool()
+def create_invoices(invoices: list) -> str:
+    """Create and post many invoices in Odoo in one batch (e.g. month-end billing).
+
+    Each invoice succeeds or fails on its own; the result lists both.
+
+    Args:
+        invoices: List of dicts with 'partner_name', 'lines' (each with 'description', 'quantity', 'price_unit') and optional 'invoice_type'
+    """
+    import json
+    results = odoo_utils.create_invoices(invoices)
+    ok = [r for r in results if 'error' not in r]
+    audit_logger.log_action("create_invoices", "mcp_server", f"{len(ok)}/{len(results)} invoices", {"amount": sum(r['amount_total'] for r in ok)}, "manual", "success" if len(ok) == len(results) else "partial")
+    return json.dumps(results, indent=2, default=str)
+
+
+@mcp.tool()
+def create_crm_leads(leads: list) -> str:
+    """Create many CRM leads or opportunities in Odoo in one batch.
+
+    Args:
+        leads: List of dicts with 'name' and optional 'partner_name', 'expected_revenue', 'description', 'lead_type'
+    """
+    import json
+    results = odoo_utils.create_crm_leads(leads)
+    ok = [r for r in results if 'error' not in r]
+    audit_logger.log_action("create_crm_leads", "mcp_server", f"{len(ok)}/{len(results)} leads", {}, "manual", "success" if len(ok) == len(results) else "partial")
+    return json.dumps(results, indent=2, default=str)
+
+
+@mcp.tool()
+def create_sale_orders(orders: list) -> str:
+    """Create and confirm many sales orders in Odoo in one batch.
+
+    Each order succeeds or fails on its own; the result lists both.
+
+    Args:
+        orders: List of dicts with 'partner_name' and 'lines' (each with 'product_name', 'quantity', 'price_unit')
+    """
+    import json
+    results = odoo_utils.create_sale_orders(orders)
+    ok = [r for r in results if 'error' not in r]
+    audit_logger.log_action("create_sale_orders", "mcp_server", f"{len(ok)}/{len(results)} orders", {"amount": sum(r['amount_total'] for r in ok)}, "manual", "success" if len(ok) == len(results) else "partial")
+    return json.dumps(results, indent=2, default=str)
+
+
 @mcp.tool()
 def odoo_search(model: str, domain: list = None, fields: list = None, limit: int = 10) -> str:
     """Search and read records from any Odoo model.
@@ -150,14 +246,42 @@ def odoo_search(model: str, domain: list = None, fields: list = None, limit: int
         limit: Max number of records to return
     """
     import json
-    uid, models = odoo_utils._connect()
-    results = models.execute_kw(
-        odoo_utils.ODOO_DB, uid, odoo_utils.ODOO_PASS, model, 'search_read',
-        [domain or []], {'fields': fields or [], 'limit': limit}
+    results = odoo_utils.get_client().execute_kw(
+        model, 'search_read', [domain or []], {'fields': fields or [], 'limit': limit}
     )
     return json.dumps(results, indent=2, default=str)
 
 
+@mcp.tool()
+def odoo_cache_stats(clear: bool = False) -> str:
+    """Show hit rates of the Odoo reference-data cache (partners, accounts, journals, stages).
+
+    Args:
+        clear: Also drop every cached lookup, e.g. after renaming partners in Odoo
+    """
+    import json
+    stats = odoo_utils.cache_stats()
+    if clear:
+        odoo_utils.invalidate_cache()
+    return json.dumps(stats, indent=2)
+
+
+@mcp.tool()
+def odoo_history(report: str, options: dict = None) -> str:
+    """Aggregate the full Odoo history kept locally by the accounting watcher, without querying Odoo.
+
+    Args:
+        report: One of revenue_by_month, top_customers, unpaid_invoices, pipeline, sales_by_month, stock_movement
+        options: Report options, e.g. {"months": 24} for the *_by_month reports, {"limit": 5, "since": "2026-01-01"} for top_customers and stock_movement
+    """
+    import json
+    import odoo_sync
+    if report not in odoo_sync.REPORTS:
+        return f"Unknown report '{report}'. Available: {', '.join(odoo_sync.REPORTS)}"
+    rows = odoo_sync.REPORTS[report](odoo_sync.SyncStore(), **(options or {}))
+    return json.dumps(rows, indent=2, default=str)
+
+
 @mcp.tool()
 def post_facebook(message: str, image_url: str = None) -> str:
     """Post to the Facebook Page.
@@ -253,4 +377,7 @@ def draft_linkedin(text: str) -> str:
 
 
 if __name__ == "__main__":
+    bulk_email.resume_jobs()
+    # Drop cached partner/account/journal/stage lookups as soon as Odoo reports a change
+    odoo_feed.start(lambda model, ids: odoo_utils.invalidate_cache(model))
     mcp.run(transport="stdio")
@@ -0,0 +1,181 @@
+"""Real-time Odoo change feed over the bus long-polling endpoint.
+
+Odoo does not put ordinary record writes on its bus, so the database needs
+a small server-side notifier: an automated action on each watched model
+(trigger "On create and edit", plus one "On deletion") running
+
+    env['bus.bus']._sendone('ai_employee_changes', 'odoo_change',
+                            {'model': model._name, 'ids': records.ids})
+
+ChangeFeed logs in with a web session, long-polls /longpolling/poll for
+that channel and calls on_change(model, ids) for every notification about
+a watched model. Servers that only offer /websocket can run any relay that
+serves the same long-poll contract and set odoo.feed.url to it.
+
+The accounting watcher syncs shortly after a notification arrives instead
+of waiting out odoo.sync_interval (after odoo.feed.coalesce seconds, and
+no sooner than odoo.feed.min_sync_gap after the previous cycle started); the MCP server drops cached lookups for
+the changed model (add the notifier to res.partner, account.account,
+account.journal and crm.stage for those). The feed is optional
+(odoo.feed.enabled) and only cuts latency. The
+periodic incremental sync stays the source of truth, so a lost
+notification costs at most one sync interval.
+
+Usage (prints notifications as they arrive):
+    python odoo_feed.py [--url http://localhost:8069]
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import odoo_utils
+from config import get_odoo_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = 'ai_employee_changes'
+POLL_TIMEOUT = 50  # seconds Odoo holds a poll open when nothing happens
+RETRY_BASE = 5
+RETRY_MAX = 300
+
+
+class FeedError(Exception):
+    pass
+
+
+class ChangeFeed:
+    """Background thread that turns bus notifications into on_change(model, ids) calls."""
+
+    def __init__(self, url, db, user, password, on_change, models=None,
+                 channel=DEFAULT_CHANNEL, poll_timeout=POLL_TIMEOUT):
+        parts = urlsplit(url)
+        self._conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._base = parts.path.rstrip('/')
+        self.db = db
+        self.user = user
+        self.password = password
+        self.on_change = on_change
+        self.models = set(models) if models else None
+        self.channel = channel
+        # Leave the server room to answer an empty poll before the socket gives up
+        self.http_timeout = poll_timeout + 15
+        self.last = 0
+        self._conn = None
+        self._session = None
+        self._ids = itertools.count(1)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _call(self, path, params):
+        conn = self._conn
+        if conn is None:
+            conn = self._conn = self._conn_class(self._netloc, timeout=self.http_timeout)
+        headers = {'Content-Type': 'application/json'}
+        if self._session:
+            headers['Cookie'] = f'session_id={self._session}'
+        body = json.dumps({'jsonrpc': '2.0', 'method': 'call', 'id': next(self._ids), 'params': params})
+        try:
+            conn.request('POST', f'{self._base}{path}', body.encode(), headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except Exception:
+            conn.close()
+            self._conn = None
+            raise
+        if resp.status != 200:
+            raise FeedError(f'{path} returned HTTP {resp.status} {resp.reason}')
+        for name, value in resp.getheaders():
+            if name.lower() == 'set-cookie' and value.startswith('session_id='):
+                self._session = value.split(';', 1)[0].split('=', 1)[1]
+        reply = json.loads(data)
+        if 'error' in reply:
+            error = reply['error']
+            raise FeedError((error.get('data') or {}).get('message') or error.get('message', 'Odoo error'))
+        return reply['result']
+
+    def login(self):
+        result = self._call('/web/session/authenticate',
+                            {'db': self.db, 'login': self.user, 'password': self.password})
+        if not (result or {}).get('uid') or not self._session:
+            raise FeedError('Odoo bus login failed')
+
+    def poll(self):
+        """Wait for the next batch of notifications; returns [(model, ids)] for watched models."""
+        notifications = self._call('/longpolling/poll', {'channels': [self.channel], 'last': self.last, 'options': {}})
+        changes = []
+        for notification in notifications:
+            self.last = max(self.last, notification['id'])
+            message = notification.get('message')
+            # Odoo 15+ wraps messages as {'type', 'payload'}; 14 sends the payload itself
+            payload = message.get('payload', message) if isinstance(message, dict) else None
+            if not isinstance(payload, dict) or 'model' not in payload:
+                continue
+            if self.models is None or payload['model'] in self.models:
+                changes.append((payload['model'], payload.get('ids') or []))
+        return changes
+
+    def run(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                if self._session is None:
+                    self.login()
+                for model, ids in self.poll():
+                    try:
+                        self.on_change(model, ids)
+                    except Exception as e:
+                        logger.error(f'Odoo feed handler failed for {model}: {e}')
+                failures = 0
+            except Exception as e:
+                failures += 1
+                # Expired sessions come back as errors too; log in again on the next attempt
+                self._session = None
+                delay = min(RETRY_MAX, RETRY_BASE * 2 ** (failures - 1))
+                logger.warning(f'Odoo feed poll failed ({e}), retrying in {delay}s')
+                self._stop.wait(delay)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='odoo-feed', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        conn = self._conn
+        if conn is not None:
+            # Unblocks a poll the server is holding open
+            conn.close()
+
+
+def start(on_change, models=None):
+    """Start the feed configured in odoo.feed; returns None when it is disabled."""
+    cfg = get_odoo_config().get('feed', {})
+    if not cfg.get('enabled'):
+        return None
+    feed = ChangeFeed(cfg.get('url') or odoo_utils.ODOO_URL, odoo_utils.ODOO_DB, odoo_utils.ODOO_USER,
+                      odoo_utils.ODOO_PASS, on_change, models,
+                      cfg.get('channel', DEFAULT_CHANNEL), cfg.get('poll_timeout', POLL_TIMEOUT))
+    logger.info(f'Odoo change feed listening on {feed.channel}')
+    return feed.start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print Odoo bus change notifications as they arrive.')
+    parser.add_argument('--url', default=odoo_utils.ODOO_URL)
+    parser.add_argument('--channel', default=DEFAULT_CHANNEL)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    feed = ChangeFeed(args.url, odoo_utils.ODOO_DB, odoo_utils.ODOO_USER, odoo_utils.ODOO_PASS,
+                      lambda model, ids: print(f'[{time.strftime("%H:%M:%S")}] {model} {ids}'),
+                      channel=args.channel)
+    try:
+        feed.run()
+    except KeyboardInterrupt:
+        feed.stop()
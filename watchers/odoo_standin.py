@@ -0,0 +1,192 @@
+"""Minimal local stand-in for an Odoo server, for benchmarks and manual testing.
+
+Speaks the same wire protocols as Odoo (/xmlrpc/2/common, /xmlrpc/2/object
+and /jsonrpc) but none of its business logic: authenticate accepts any
+credentials, and search_read on any model returns synthetic rows shaped
+like account.move records.
+
+It also serves the bus long-polling endpoint (/web/session/authenticate,
+/longpolling/poll) used by odoo_feed. notify() publishes a change
+notification; --events-every publishes synthetic ones on a timer.
+
+Usage:
+    python odoo_standin.py [--port 8169] [--rows 2000] [--events-every 5]
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import xmlrpc.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UID = 2
+SESSION_ID = 'standin-session'
+FEED_MODELS = ['account.move', 'sale.order', 'crm.lead', 'stock.move']
+
+
+def make_rows(count):
+    """Synthetic records with the mix of field types a wide search_read returns."""
+    return [{
+        'id': i,
+        'name': f'INV/2026/{i:05d}',
+        'ref': f'PO-{i * 7:06d}',
+        'partner_id': [100 + i % 50, f'Customer {i % 50}'],
+        'currency_id': [1, 'USD'],
+        'journal_id': [1, 'Customer Invoices'],
+        'amount_untaxed': round(i * 13.37, 2),
+        'amount_tax': round(i * 2.01, 2),
+        'amount_total': round(i * 15.38, 2),
+        'amount_residual': 0.0,
+        'state': 'posted',
+        'payment_state': 'paid' if i % 3 else 'not_paid',
+        'move_type': 'out_invoice',
+        'date': '2026-10-01',
+        'invoice_date': '2026-10-01',
+        'invoice_date_due': '2026-10-31',
+        'write_date': '2026-10-01 12:00:00',
+        'narration': False,
+        'invoice_line_ids': [i * 10 + 1, i * 10 + 2, i * 10 + 3],
+    } for i in range(1, count + 1)]
+
+
+class StandInServer:
+    def __init__(self, port=0, rows=2000, poll_timeout=50):
+        self.rows = make_rows(rows)
+        self.poll_timeout = poll_timeout
+        self.notifications = []
+        self._bus = threading.Condition()
+        self._bus_ids = itertools.count(1)
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                cookie = None
+                if self.path == '/jsonrpc':
+                    payload = standin._jsonrpc(json.loads(body))
+                    content_type = 'application/json'
+                elif self.path == '/web/session/authenticate':
+                    payload = standin._web(json.loads(body), {'uid': UID})
+                    content_type = 'application/json'
+                    cookie = f'session_id={SESSION_ID}; Path=/; HttpOnly'
+                elif self.path == '/longpolling/poll':
+                    if f'session_id={SESSION_ID}' not in self.headers.get('Cookie', ''):
+                        self.send_error(403)
+                        return
+                    request = json.loads(body)
+                    payload = standin._web(request, standin.poll(request['params']['channels'],
+                                                                 request['params']['last']))
+                    content_type = 'application/json'
+                elif self.path.startswith('/xmlrpc/2/'):
+                    payload = standin._xmlrpc(self.path.rsplit('/', 1)[1], body)
+                    content_type = 'text/xml'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                if cookie:
+                    self.send_header('Set-Cookie', cookie)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name='odoo-standin', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def notify(self, model, ids, channel='ai_employee_changes'):
+        """Publish a change notification the way the server-side notifier does."""
+        with self._bus:
+            self.notifications.append({
+                'id': next(self._bus_ids), 'channel': channel,
+                'message': {'type': 'odoo_change', 'payload': {'model': model, 'ids': list(ids)}},
+            })
+            self._bus.notify_all()
+
+    def poll(self, channels, last):
+        """Notifications on channels after last, waiting up to poll_timeout for one."""
+        def pending():
+            return [n for n in self.notifications if n['id'] > last and n['channel'] in channels]
+        with self._bus:
+            self._bus.wait_for(pending, timeout=self.poll_timeout)
+            return pending()
+
+    def emit_events(self, every):
+        """Publish a synthetic change for a random watched model every `every` seconds."""
+        def loop():
+            while True:
+                time.sleep(every)
+                self.notify(random.choice(FEED_MODELS), [random.randint(1, len(self.rows))])
+        threading.Thread(target=loop, name='odoo-standin-events', daemon=True).start()
+
+    def dispatch(self, service, method, args):
+        if service == 'common' and method == 'authenticate':
+            return UID
+        if service == 'common' and method == 'version':
+            return {'server_version': 'standin'}
+        if service == 'object' and method == 'execute_kw':
+            model, model_method, _, kwargs = (list(args[3:]) + [{}])[:4]
+            if model_method == 'search_read':
+                limit = kwargs.get('limit') or len(self.rows)
+                return self.rows[:limit]
+            if model_method == 'search':
+                return [row['id'] for row in self.rows]
+            raise xmlrpc.client.Fault(1, f'{model}.{model_method} is not supported by the stand-in')
+        raise xmlrpc.client.Fault(1, f'Unknown method {service}.{method}')
+
+    def _xmlrpc(self, service, body):
+        args, method = xmlrpc.client.loads(body)
+        try:
+            result = (self.dispatch(service, method, args),)
+        except xmlrpc.client.Fault as fault:
+            result = fault
+        return xmlrpc.client.dumps(result, methodresponse=True, allow_none=True).encode()
+
+    def _jsonrpc(self, request):
+        params = request['params']
+        reply = {'jsonrpc': '2.0', 'id': request.get('id')}
+        try:
+            reply['result'] = self.dispatch(params['service'], params['method'], params['args'])
+        except xmlrpc.client.Fault as fault:
+            reply['error'] = {'code': 200, 'message': 'Odoo Server Error',
+                              'data': {'name': 'odoo.exceptions.UserError', 'message': fault.faultString}}
+        return json.dumps(reply).encode()
+
+    @staticmethod
+    def _web(request, result):
+        return json.dumps({'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}).encode()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8169)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--events-every', type=float, help='publish a synthetic bus event every N seconds')
+    args = parser.parse_args()
+    server = StandInServer(args.port, args.rows)
+    if args.events_every:
+        server.emit_events(args.events_every)
+    print(f'Odoo stand-in listening on {server.url} ({args.rows} rows)')
+    server.httpd.serve_forever()
@@ -0,0 +1,549 @@
+"""Incremental Odoo sync into a local SQLite store.
+
+Each dataset the accounting watcher renders maps to one Odoo model. A sync
+fetches only records written since shortly before the model's stored
+high-water mark and merges them into odoo_sync.db, so a cycle costs one
+small search_read per model when little has changed. Filters such as
+"posted moves only" are applied when reading from the store, not in the
+Odoo domain, so a record that leaves the filter (e.g. a cancelled move)
+is still picked up as a change.
+
+write_date never reveals deletions, so reconcile() periodically compares
+the local IDs with an ids-only search and prunes records that are gone.
+Non-stored computed fields (a product's qty_available) change without
+bumping write_date either; a dataset lists them under 'refresh' and sync()
+re-reads them for every stored record each cycle.
+
+change_events() turns merged and pruned records into business events
+("invoice INV/2026/0012 moved to paid", "new lead created") for the
+accounting watcher to file in Needs_Action.
+
+The first sync of a model streams its full history in pages. Besides the
+raw record, each row keeps a few typed, indexed columns (kind, state,
+date, party, amount), so the reports below aggregate years of history in
+milliseconds without touching Odoo. They back the briefing
+(python odoo_sync.py --briefing) and the odoo_history MCP tool.
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+STORE_DB = Path(__file__).parent / 'odoo_sync.db'
+DEFAULT_PAGE_SIZE = 500
+# Odoo stamps write_date with the transaction's start time, so a record
+# committed after a sync can carry a write_date older than the high-water
+# mark that sync recorded. Each sync re-reads this many seconds before it.
+SYNC_LOOKBACK = 300
+
+DATASETS = {
+    'transactions': {
+        'model': 'account.move',
+        'fields': ['name', 'amount_total', 'partner_id', 'invoice_date', 'date',
+                   'payment_state', 'move_type', 'state'],
+        'columns': {'kind': 'move_type', 'state': 'state', 'date': 'date',
+                    'party': 'partner_id', 'amount': 'amount_total'},
+    },
+    'leads': {
+        'model': 'crm.lead',
+        'fields': ['name', 'partner_id', 'expected_revenue', 'stage_id', 'type',
+                   'probability', 'create_date'],
+        'columns': {'kind': 'type', 'state': 'stage_id', 'date': 'create_date',
+                    'party': 'partner_id', 'amount': 'expected_revenue'},
+    },
+    'orders': {
+        'model': 'sale.order',
+        'fields': ['name', 'partner_id', 'amount_total', 'state', 'date_order'],
+        'columns': {'state': 'state', 'date': 'date_order', 'party': 'partner_id',
+                    'amount': 'amount_total'},
+    },
+    'inventory': {
+        'model': 'product.product',
+        'fields': ['name', 'default_code', 'qty_available', 'list_price', 'type'],
+        # Computed from stock quants; stock moves do not touch the product's write_date
+        'refresh': ['qty_available'],
+        'columns': {'kind': 'type', 'party': 'name', 'amount': 'qty_available'},
+    },
+    'stock_moves': {
+        'model': 'stock.move',
+        'fields': ['product_id', 'quantity', 'date', 'origin', 'location_dest_id', 'state'],
+        # party is the product for stock moves
+        'columns': {'state': 'state', 'date': 'date', 'party': 'product_id', 'amount': 'quantity'},
+    },
+}
+COLUMNS = ['kind', 'state', 'date', 'party', 'amount']
+MODEL_COLUMNS = {spec['model']: spec['columns'] for spec in DATASETS.values()}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    model TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    write_date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    kind TEXT,
+    state TEXT,
+    date TEXT,
+    party TEXT,
+    amount REAL,
+    PRIMARY KEY (model, id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    model TEXT PRIMARY KEY,
+    high_water TEXT,
+    synced_at REAL,
+    reconciled_at REAL,
+    backfilled_at REAL
+);
+"""
+# Created after the column migration so stores from before it get them too
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_records_state_date ON records (model, state, date);
+CREATE INDEX IF NOT EXISTS idx_records_party ON records (model, party);
+CREATE INDEX IF NOT EXISTS idx_records_date ON records (model, date);
+"""
+
+
+def _column_values(model, row):
+    """Typed column values for a record; many2one fields become their display name."""
+    values = []
+    for column in COLUMNS:
+        value = row.get(MODEL_COLUMNS.get(model, {}).get(column))
+        if isinstance(value, list):
+            value = value[1] if len(value) > 1 else value[0]
+        values.append(None if value is False else value)
+    return values
+
+
+class SyncStore:
+    """Local copy of synced Odoo records, one row per (model, id)."""
+
+    def __init__(self, path=STORE_DB):
+        self.path = Path(path)
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._initialized:
+                # sync_all opens the store from several threads at once
+                with self._init_lock:
+                    if not self._initialized:
+                        self._init(conn)
+                        self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    def _init(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        # One write transaction, so another process upgrading the same store
+        # waits and then finds the columns already added
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._migrate(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.executescript(INDEXES)
+
+    @staticmethod
+    def _migrate(conn):
+        state_columns = {row['name'] for row in conn.execute('PRAGMA table_info(sync_state)')}
+        if 'backfilled_at' not in state_columns:
+            # Stores from before this column finished their backfill long ago
+            conn.execute('ALTER TABLE sync_state ADD COLUMN backfilled_at REAL')
+            conn.execute('UPDATE sync_state SET backfilled_at = synced_at')
+        existing = {row['name'] for row in conn.execute('PRAGMA table_info(records)')}
+        missing = [c for c in COLUMNS if c not in existing]
+        if not missing:
+            return
+        for column in missing:
+            conn.execute(f'ALTER TABLE records ADD COLUMN {column} {"REAL" if column == "amount" else "TEXT"}')
+        rows = conn.execute('SELECT model, id, data FROM records').fetchall()
+        conn.executemany(
+            f'UPDATE records SET {", ".join(f"{c} = ?" for c in COLUMNS)} WHERE model = ? AND id = ?',
+            [(*_column_values(r['model'], json.loads(r['data'])), r['model'], r['id']) for r in rows])
+
+    def high_water(self, model):
+        with self._connect() as conn:
+            row = conn.execute('SELECT high_water FROM sync_state WHERE model = ?', (model,)).fetchone()
+        return row['high_water'] if row else None
+
+    def state(self, model):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM sync_state WHERE model = ?', (model,)).fetchone()
+        return dict(row) if row else {}
+
+    def mark_backfilled(self, model):
+        with self._connect() as conn:
+            conn.execute('UPDATE sync_state SET backfilled_at = ? WHERE model = ?', (time.time(), model))
+
+    def query(self, sql, params=()):
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute(sql, params)]
+
+    def merge(self, model, rows):
+        """Upsert fetched rows and advance the high-water mark.
+
+        Returns [(old, new)] for every record that is new (old is None) or
+        whose data changed; re-fetched identical rows are ignored.
+        """
+        changes = []
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                high_water = conn.execute(
+                    'SELECT high_water FROM sync_state WHERE model = ?', (model,)).fetchone()
+                high_water = high_water['high_water'] if high_water else None
+                for row in rows:
+                    data = json.dumps(row, sort_keys=True, default=str)
+                    old = conn.execute(
+                        'SELECT data FROM records WHERE model = ? AND id = ?', (model, row['id'])).fetchone()
+                    if old is not None and old['data'] == data:
+                        continue
+                    conn.execute(
+                        'INSERT OR REPLACE INTO records (model, id, write_date, data, kind, state, date, party, amount) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (model, row['id'], row['write_date'], data, *_column_values(model, row)))
+                    changes.append((json.loads(old['data']) if old else None, row))
+                if rows:
+                    high_water = max(high_water or '', *(row['write_date'] for row in rows))
+                conn.execute(
+                    'INSERT INTO sync_state (model, high_water, synced_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT (model) DO UPDATE SET high_water = excluded.high_water, synced_at = excluded.synced_at',
+                    (model, high_water, time.time()))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return changes
+
+    def prune(self, model, live_ids):
+        """Delete local records whose IDs are not in live_ids; returns the removed records."""
+        live_ids = set(live_ids)
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                removed = [
+                    json.loads(r['data'])
+                    for r in conn.execute('SELECT id, data FROM records WHERE model = ?', (model,))
+                    if r['id'] not in live_ids
+                ]
+                conn.executemany('DELETE FROM records WHERE model = ? AND id = ?',
+                                 [(model, r['id']) for r in removed])
+                conn.execute(
+                    'INSERT INTO sync_state (model, reconciled_at) VALUES (?, ?) '
+                    'ON CONFLICT (model) DO UPDATE SET reconciled_at = excluded.reconciled_at',
+                    (model, time.time()))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return removed
+
+    def patch(self, model, rows):
+        """Overwrite fields of stored records with fresh values.
+
+        Rows for records not in the store are ignored. Returns [(old, new)]
+        for every record whose data changed.
+        """
+        changes = []
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for row in rows:
+                    stored = conn.execute(
+                        'SELECT data FROM records WHERE model = ? AND id = ?', (model, row['id'])).fetchone()
+                    if stored is None:
+                        continue
+                    old = json.loads(stored['data'])
+                    new = {**old, **row}
+                    if new == old:
+                        continue
+                    conn.execute(
+                        'UPDATE records SET data = ?, kind = ?, state = ?, date = ?, party = ?, amount = ? '
+                        'WHERE model = ? AND id = ?',
+                        (json.dumps(new, sort_keys=True, default=str), *_column_values(model, new), model, row['id']))
+                    changes.append((old, new))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return changes
+
+    def records(self, model):
+        with self._connect() as conn:
+            rows = conn.execute('SELECT data FROM records WHERE model = ?', (model,)).fetchall()
+        return [json.loads(r['data']) for r in rows]
+
+
+def sync(client, store, name, page_size=DEFAULT_PAGE_SIZE):
+    """Fetch records of a dataset changed since the last sync; returns the merged changes.
+
+    Records are streamed in (write_date, id) order, page_size at a time,
+    and each page is merged as it arrives, so an interrupted backfill
+    resumes where it stopped. Pages follow a keyset cursor rather than an
+    offset: an offset skips rows whenever a record earlier in the order is
+    modified mid-stream, a keyset cursor cannot.
+    """
+    spec = DATASETS[name]
+    model = spec['model']
+    fields = spec['fields'] + ['write_date']
+    high_water = store.high_water(model)
+    # The first page re-reads SYNC_LOOKBACK seconds before the high-water
+    # mark (merge() skips the unchanged rows), later pages continue strictly
+    # after the last (write_date, id) fetched
+    domain = [('write_date', '>=', _lookback(high_water))] if high_water else []
+    changes = []
+    fetched = 0
+    while True:
+        rows = client.execute_kw(model, 'search_read', [domain],
+            {'fields': fields, 'order': 'write_date asc, id asc', 'limit': page_size})
+        changes += store.merge(model, rows)
+        fetched += len(rows)
+        if len(rows) < page_size:
+            break
+        write_date, last_id = rows[-1]['write_date'], rows[-1]['id']
+        domain = ['|', ('write_date', '>', write_date),
+                  '&', ('write_date', '=', write_date), ('id', '>', last_id)]
+    if spec.get('refresh'):
+        changes += _refresh(client, store, model, spec['refresh'], page_size)
+    if changes:
+        logger.info(f'{name}: {len(changes)} changed of {fetched} fetched')
+    if not store.state(model).get('backfilled_at'):
+        store.mark_backfilled(model)
+    return changes
+
+
+def _lookback(high_water):
+    try:
+        since = datetime.strptime(high_water, '%Y-%m-%d %H:%M:%S') - timedelta(seconds=SYNC_LOOKBACK)
+    except ValueError:
+        return high_water
+    return since.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _refresh(client, store, model, fields, page_size):
+    """Re-read fields that change without a write_date bump, paging by id."""
+    changes = []
+    last_id = 0
+    while True:
+        rows = client.execute_kw(model, 'search_read', [[('id', '>', last_id)]],
+            {'fields': fields, 'order': 'id asc', 'limit': page_size})
+        changes += store.patch(model, rows)
+        if len(rows) < page_size:
+            return changes
+        last_id = rows[-1]['id']
+
+
+def reconcile(client, store, name):
+    """Drop local records of a dataset that no longer exist in Odoo; returns them."""
+    model = DATASETS[name]['model']
+    removed = store.prune(model, client.execute_kw(model, 'search', [[]]))
+    if removed:
+        logger.info(f'{name}: pruned {len(removed)} records deleted in Odoo')
+    return removed
+
+
+MOVE_TYPES = {
+    'out_invoice': 'invoice',
+    'out_refund': 'credit note',
+    'in_invoice': 'bill',
+    'in_refund': 'refund',
+    'entry': 'journal entry',
+}
+ORDER_STATES = {'draft': 'Quotation', 'sent': 'Sent', 'sale': 'Confirmed', 'done': 'Done', 'cancel': 'Cancelled'}
+
+
+def _display(value, default='N/A'):
+    """Display name of a many2one value ([id, name] or False)."""
+    return value[1] if value else default
+
+
+def _move_events(old, new):
+    label = MOVE_TYPES.get((new or old)['move_type'], 'entry')
+    name = (new or old)['name']
+    if new is None:
+        return [('deleted', None, None, f'{label} {name} deleted in Odoo')] if old['state'] == 'posted' else []
+    if old is None:
+        if new['state'] != 'posted':
+            return []  # drafts surface once they are posted
+        return [('created', None, 'posted', f'new {label} {name} posted: ${new["amount_total"]} '
+                 f'for {_display(new["partner_id"])}')]
+    events = []
+    if old['state'] != new['state']:
+        events.append(('state', old['state'], new['state'], f'{label} {name} moved from {old["state"]} to {new["state"]}'))
+    if new['state'] == 'posted' and old['payment_state'] != new['payment_state']:
+        events.append(('payment_state', old['payment_state'], new['payment_state'],
+                       f'{label} {name} moved to {new["payment_state"]}'))
+    return events
+
+
+def _lead_events(old, new):
+    if new is None:
+        return [('deleted', None, None, f'{old["type"]} {old["name"]} deleted in Odoo')]
+    if old is None:
+        return [('created', None, new['type'], f'new {new["type"]} created: {new["name"]} '
+                 f'({_display(new["partner_id"])}, ${new["expected_revenue"]})')]
+    events = []
+    if old['type'] == 'lead' and new['type'] == 'opportunity':
+        events.append(('type', 'lead', 'opportunity', f'lead {new["name"]} converted to an opportunity'))
+    if old['stage_id'] != new['stage_id']:
+        stage = _display(new['stage_id'])
+        events.append(('stage_id', _display(old['stage_id']), stage, f'{new["type"]} {new["name"]} moved to {stage}'))
+    return events
+
+
+def _order_events(old, new):
+    if new is None:
+        return [('deleted', None, None, f'order {old["name"]} deleted in Odoo')]
+    state = ORDER_STATES.get(new['state'], new['state'])
+    if old is None:
+        return [('created', None, new['state'], f'new {state.lower()} {new["name"]} for '
+                 f'{_display(new["partner_id"])}: ${new["amount_total"]}')]
+    if old['state'] != new['state']:
+        return [('state', old['state'], new['state'], f'order {new["name"]} moved to {state}')]
+    return []
+
+
+def _product_events(old, new):
+    if new is None or new['type'] != 'product':
+        return []
+    if old is None:
+        return [('created', None, new['qty_available'], f'new product {new["name"]} ({new["qty_available"]} units)')]
+    if old['qty_available'] > 0 >= new['qty_available']:
+        return [('qty_available', old['qty_available'], new['qty_available'], f'product {new["name"]} is out of stock')]
+    if old['qty_available'] <= 0 < new['qty_available']:
+        return [('qty_available', old['qty_available'], new['qty_available'],
+                 f'product {new["name"]} back in stock ({new["qty_available"]} units)')]
+    return []
+
+
+# Stock moves have no events of their own: their effect on stock levels is reported
+# by the inventory dataset, whose qty_available sync() refreshes every cycle
+EVENT_RULES = {
+    'transactions': _move_events,
+    'leads': _lead_events,
+    'orders': _order_events,
+    'inventory': _product_events,
+}
+
+
+def change_events(name, changes):
+    """Business events for a dataset's [(old, new)] changes; new is None for deletions."""
+    rule = EVENT_RULES.get(name)
+    if rule is None:
+        return []
+    events = []
+    for old, new in changes:
+        record = new or old
+        for event, before, after, summary in rule(old, new):
+            events.append({'dataset': name, 'model': DATASETS[name]['model'], 'id': record['id'],
+                           'event': event, 'from': before, 'to': after, 'summary': summary})
+    return events
+
+def revenue_by_month(store, months=12):
+    """Posted customer revenue and vendor bills per month, refunds netted out."""
+    return store.query(
+        "SELECT substr(date, 1, 7) AS month, "
+        "  ROUND(SUM(CASE kind WHEN 'out_invoice' THEN amount WHEN 'out_refund' THEN -amount ELSE 0 END), 2) AS revenue, "
+        "  ROUND(SUM(CASE kind WHEN 'in_invoice' THEN amount WHEN 'in_refund' THEN -amount ELSE 0 END), 2) AS bills, "
+        "  COUNT(*) AS moves "
+        "FROM records WHERE model = 'account.move' AND state = 'posted' AND date IS NOT NULL "
+        "GROUP BY month ORDER BY month DESC LIMIT ?", (months,))
+
+
+def top_customers(store, limit=10, since=None):
+    """Customers by posted invoice total, optionally since a YYYY-MM-DD date."""
+    return store.query(
+        "SELECT party AS customer, ROUND(SUM(amount), 2) AS invoiced, COUNT(*) AS invoices "
+        "FROM records WHERE model = 'account.move' AND state = 'posted' AND kind = 'out_invoice' "
+        "  AND party IS NOT NULL AND date >= ? "
+        "GROUP BY party ORDER BY invoiced DESC LIMIT ?", (since or '', limit))
+
+
+def unpaid_invoices(store, limit=20):
+    """Posted customer invoices not yet paid, oldest first."""
+    return store.query(
+        "SELECT json_extract(data, '$.name') AS invoice, party AS customer, amount, date, "
+        "  json_extract(data, '$.payment_state') AS payment_state "
+        "FROM records WHERE model = 'account.move' AND state = 'posted' AND kind = 'out_invoice' "
+        "  AND json_extract(data, '$.payment_state') IN ('not_paid', 'partial') "
+        "ORDER BY date LIMIT ?", (limit,))
+
+
+def pipeline(store):
+    """CRM leads and opportunities per stage with expected revenue."""
+    return store.query(
+        "SELECT state AS stage, kind AS type, COUNT(*) AS count, ROUND(SUM(amount), 2) AS expected_revenue "
+        "FROM records WHERE model = 'crm.lead' GROUP BY state, kind ORDER BY expected_revenue DESC")
+
+
+def sales_by_month(store, months=12):
+    """Confirmed sales order totals per month."""
+    return store.query(
+        "SELECT substr(date, 1, 7) AS month, ROUND(SUM(amount), 2) AS total, COUNT(*) AS orders "
+        "FROM records WHERE model = 'sale.order' AND state IN ('sale', 'done') AND date IS NOT NULL "
+        "GROUP BY month ORDER BY month DESC LIMIT ?", (months,))
+
+
+def stock_movement(store, since=None, limit=20):
+    """Quantities moved per product in done stock moves, optionally since a date."""
+    return store.query(
+        "SELECT party AS product, ROUND(SUM(amount), 2) AS quantity, COUNT(*) AS moves "
+        "FROM records WHERE model = 'stock.move' AND state = 'done' AND date >= ? "
+        "GROUP BY party ORDER BY quantity DESC LIMIT ?", (since or '', limit))
+
+
+REPORTS = {
+    'revenue_by_month': revenue_by_month,
+    'top_customers': top_customers,
+    'unpaid_invoices': unpaid_invoices,
+    'pipeline': pipeline,
+    'sales_by_month': sales_by_month,
+    'stock_movement': stock_movement,
+}
+
+
+def _table(rows):
+    if not rows:
+        return '_No data._\n'
+    headers = list(rows[0])
+    lines = ['| ' + ' | '.join(headers) + ' |', '|' + '---|' * len(headers)]
+    lines += ['| ' + ' | '.join('' if r[h] is None else str(r[h]) for h in headers) + ' |' for r in rows]
+    return '\n'.join(lines) + '\n'
+
+
+def briefing_markdown(store):
+    """Every report as markdown tables, for the CEO briefing context."""
+    sections = []
+    for name, report in REPORTS.items():
+        title = name.replace('_', ' ').capitalize()
+        sections.append(f'## {title}\n{_table(report(store))}')
+    return '\n'.join(sections)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the local Odoo history store.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--report', choices=sorted(REPORTS), help='print one report as JSON')
+    group.add_argument('--briefing', action='store_true', help='print every report as markdown')
+    args = parser.parse_args()
+    store = SyncStore()
+    if args.briefing:
+        print(briefing_markdown(store))
+    else:
+        print(json.dumps(REPORTS[args.report](store), indent=2))
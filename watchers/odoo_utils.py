@@ -1,9 +1,35 @@
-"""Odoo XML-RPC utilities for the orchestrator."""
+"""Odoo XML-RPC utilities for the orchestrator.
+
+All calls go through one process-wide OdooClient (see get_client()). It
+authenticates once and caches the uid, keeps an HTTP keep-alive connection
+per thread, and only re-authenticates when Odoo rejects the credentials.
+odoo.transport in config.json selects XML-RPC (default) or JSON-RPC.
+
+Reference data that rarely changes (partners, accounts, journals, CRM
+stages) is looked up through a TTL cache; see cache_stats() and
+invalidate_cache().
+"""
+import http.client
+import itertools
+import json
 import os
+import select
+import threading
+import time
 import xmlrpc.client
+from contextlib import contextmanager
 from pathlib import Path
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+from config import get_odoo_config
+
 load_dotenv(Path(__file__).parent / '.env')
 
 ODOO_URL = os.getenv('ODOO_URL', 'http://localhost:8069')
@@ -11,71 +37,432 @@ ODOO_DB = os.getenv('ODOO_DB', 'odoo_main')
 ODOO_USER = os.getenv('ODOO_USERNAME', 'admin')
 ODOO_PASS = os.getenv('ODOO_PASSWORD', 'admin')
 
+HTTP_TIMEOUT = 60
+DEFAULT_CACHE_TTL = 300
+_MISS = object()
+# Fault code Odoo's RPC layer uses for AccessDenied
+ACCESS_DENIED_FAULT = 3
+# Model methods that can be repeated safely if a connection drops mid-call
+READ_METHODS = {'search_read', 'search', 'read', 'search_count', 'fields_get', 'name_search', 'read_group'}
 
-def _connect():
-    common = xmlrpc.client.ServerProxy(f'{ODOO_URL}/xmlrpc/2/common', allow_none=True)
-    uid = common.authenticate(ODOO_DB, ODOO_USER, ODOO_PASS, {})
-    if not uid:
-        raise RuntimeError('Odoo authentication failed')
-    models = xmlrpc.client.ServerProxy(f'{ODOO_URL}/xmlrpc/2/object', allow_none=True)
-    return uid, models
 
+class _TimeoutMixin:
+    """Adds a socket timeout and safe reuse to the stdlib keep-alive transports.
 
-def create_invoice(partner_name, lines, invoice_type='out_invoice'):
-    """Create and post an invoice.
+    The stdlib replays any request whose reused connection drops, which can
+    apply a create or action_post twice. Idle sockets the server has closed
+    are replaced before sending instead, and only calls flagged idempotent
+    are left to the stdlib retry.
+    """
+    timeout = HTTP_TIMEOUT
+    idempotent = True
 
-    Args:
-        partner_name: Customer/vendor name (must exist in Odoo)
-        lines: List of dicts with keys: description, quantity, price_unit
-        invoice_type: 'out_invoice' (customer) or 'in_invoice' (vendor bill)
+    def make_connection(self, host):
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        return conn
 
-    Returns: dict with invoice id, name, amount_total
+    def request(self, host, handler, request_body, verbose=False):
+        conn = self._connection[1]
+        # An idle keep-alive socket the server has closed polls readable (EOF)
+        if conn is not None and conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            self.close()
+        if self.idempotent:
+            return super().request(host, handler, request_body, verbose)
+        return self.single_request(host, handler, request_body, verbose)
+
+
+class _Transport(_TimeoutMixin, xmlrpc.client.Transport):
+    pass
+
+
+class _SafeTransport(_TimeoutMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+class XmlRpcTransport:
+    """Odoo's /xmlrpc/2/<service> endpoints.
+
+    ServerProxy objects are not thread-safe, so each thread gets its own,
+    with its own keep-alive connection.
     """
-    uid, models = _connect()
 
-    # Find partner
-    partners = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'res.partner', 'search_read',
-        [[('name', 'ilike', partner_name)]], {'fields': ['id', 'name'], 'limit': 1})
-    if not partners:
-        raise ValueError(f'Partner not found: {partner_name}')
-    partner_id = partners[0]['id']
+    def __init__(self, url):
+        self.url = url
+        self._local = threading.local()
+
+    def _proxy(self, service):
+        """Return this thread's (ServerProxy, transport) pair for a service."""
+        proxies = getattr(self._local, 'proxies', None)
+        if proxies is None:
+            proxies = self._local.proxies = {}
+        if service not in proxies:
+            transport = _SafeTransport() if self.url.startswith('https') else _Transport()
+            proxies[service] = (xmlrpc.client.ServerProxy(
+                f'{self.url}/xmlrpc/2/{service}', transport=transport, allow_none=True), transport)
+        return proxies[service]
+
+    def call(self, service, method, *args):
+        proxy, transport = self._proxy(service)
+        # execute_kw args: db, uid, password, model, method, ...
+        transport.idempotent = service != 'object' or (len(args) > 4 and args[4] in READ_METHODS)
+        return getattr(proxy, method)(*args)
+
+
+class JsonRpcTransport:
+    """Odoo's /jsonrpc endpoint over one keep-alive connection per thread.
+
+    JSON is far cheaper to encode and parse than XML-RPC for wide
+    search_read results; orjson is used when installed. Errors are raised
+    as xmlrpc.client.Fault so callers handle both transports the same way.
+    """
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self._conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._path = f'{parts.path.rstrip("/")}/jsonrpc'
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # An idle keep-alive socket the server has closed polls readable (EOF);
+        # replace it before sending anything rather than retrying afterwards
+        if conn is not None and conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = self._local.conn = self._conn_class(self._netloc, timeout=HTTP_TIMEOUT)
+        return conn
+
+    def _post(self, body, idempotent):
+        conn = self._connection()
+        reused = conn.sock is not None
+        try:
+            conn.request('POST', self._path, body, {'Content-Type': 'application/json'})
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            self._local.conn = None
+            # The connection dropped after the request went out. Only reads are
+            # retried: a create or action_post may already have been applied.
+            if reused and idempotent:
+                return self._post(body, idempotent)
+            raise
+        if resp.status != 200:
+            raise xmlrpc.client.ProtocolError(f'{self._netloc}{self._path}', resp.status, resp.reason, dict(resp.headers))
+        return data
+
+    def call(self, service, method, *args):
+        body = json.dumps({
+            'jsonrpc': '2.0', 'method': 'call', 'id': next(self._ids),
+            'params': {'service': service, 'method': method, 'args': args},
+        })
+        # execute_kw args: db, uid, password, model, method, ...
+        idempotent = service != 'object' or (len(args) > 4 and args[4] in READ_METHODS)
+        reply = _json_loads(self._post(body.encode(), idempotent))
+        if 'error' in reply:
+            error = reply['error']
+            data = error.get('data') or {}
+            name = data.get('name', '')
+            code = ACCESS_DENIED_FAULT if name.endswith('AccessDenied') else error.get('code', 0)
+            raise xmlrpc.client.Fault(code, data.get('message') or error.get('message', 'Odoo error'))
+        return reply['result']
+
+
+TRANSPORTS = {'xmlrpc': XmlRpcTransport, 'jsonrpc': JsonRpcTransport}
+
+
+def _is_auth_fault(fault):
+    return fault.faultCode == ACCESS_DENIED_FAULT or 'AccessDenied' in str(fault.faultString)
+
+
+class OdooClient:
+    """Authenticated, thread-safe Odoo client.
+
+    The uid is cached and shared by every thread; the transport ('xmlrpc'
+    or 'jsonrpc') keeps connections alive between calls.
+    """
+
+    def __init__(self, url, db, user, password, transport='xmlrpc'):
+        self.url = url
+        self.db = db
+        self.user = user
+        self.password = password
+        self.transport = TRANSPORTS[transport](url)
+        self._uid = None
+        self._auth_lock = threading.Lock()
+
+    def authenticate(self, stale_uid=None):
+        """Return the cached uid, logging in if there is none or it is stale_uid."""
+        with self._auth_lock:
+            if self._uid is None or self._uid == stale_uid:
+                uid = self.transport.call('common', 'authenticate', self.db, self.user, self.password, {})
+                if not uid:
+                    raise RuntimeError('Odoo authentication failed')
+                self._uid = uid
+            return self._uid
+
+    @property
+    def uid(self):
+        return self._uid or self.authenticate()
+
+    def execute_kw(self, model, method, args, kwargs=None):
+        """Call model.method(*args, **kwargs), re-authenticating once on an auth fault."""
+        uid = self.uid
+        try:
+            return self.transport.call('object', 'execute_kw',
+                self.db, uid, self.password, model, method, args, kwargs or {})
+        except xmlrpc.client.Fault as e:
+            if not _is_auth_fault(e):
+                raise
+        # Another thread may already have re-authenticated
+        uid = self.authenticate(stale_uid=uid)
+        return self.transport.call('object', 'execute_kw',
+            self.db, uid, self.password, model, method, args, kwargs or {})
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide Odoo client, using the transport set in odoo.transport."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            transport = get_odoo_config().get('transport', 'xmlrpc')
+            _client = OdooClient(ODOO_URL, ODOO_DB, ODOO_USER, ODOO_PASS, transport)
+        return _client
+
+
+class RefCache:
+    """Thread-safe TTL cache for reference-data lookups.
+
+    Entries are keyed by (model, key) and expire after the model's TTL from
+    the odoo.cache_ttls config. Lookups that found nothing are cached as
+    None for odoo.negative_ttl seconds.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, model, key):
+        """Return the cached value, or _MISS if there is no live entry."""
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats.setdefault(model, {'hits': 0, 'misses': 0})
+            entry = self._entries.get((model, key))
+            if entry is not None and entry[0] > now:
+                stats['hits'] += 1
+                return entry[1]
+            stats['misses'] += 1
+            return _MISS
+
+    def put(self, model, key, value):
+        cfg = get_odoo_config()
+        if value is None:
+            ttl = cfg.get('negative_ttl', 60)
+        else:
+            ttl = cfg.get('cache_ttls', {}).get(model, DEFAULT_CACHE_TTL)
+        with self._lock:
+            self._entries[(model, key)] = (time.monotonic() + ttl, value)
 
+    def get_or_fetch(self, model, key, fetch):
+        value = self.lookup(model, key)
+        if value is _MISS:
+            # Fetched outside the lock; concurrent misses may both hit Odoo, which is harmless
+            value = fetch()
+            self.put(model, key, value)
+        return value
+
+    def invalidate(self, model=None, key=None):
+        with self._lock:
+            if model is None:
+                self._entries.clear()
+            elif key is None:
+                self._entries = {k: v for k, v in self._entries.items() if k[0] != model}
+            else:
+                self._entries.pop((model, key), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                model: {**s, 'hit_rate': s['hits'] / (s['hits'] + s['misses'])}
+                for model, s in self._stats.items()
+            }
+
+
+_cache = RefCache()
+
+
+def invalidate_cache(model=None, key=None):
+    """Drop cached lookups: everything, one model, or one (model, key) entry."""
+    _cache.invalidate(model, key)
+
+
+def cache_stats():
+    """Per-model cache hits, misses and hit rate since the process started."""
+    return _cache.stats()
+
+
+@contextmanager
+def _invalidate_on_fault():
+    """Drop cached IDs when Odoo rejects a write; one of them may be stale."""
+    try:
+        yield
+    except xmlrpc.client.Fault:
+        _cache.invalidate()
+        raise
+
+
+def _first(client, model, domain, fields):
+    rows = client.execute_kw(model, 'search_read', [domain], {'fields': fields, 'limit': 1})
+    return rows[0] if rows else None
+
+
+def _find_partner(client, partner_name):
+    """Return {'id', 'name'} of the first partner matching partner_name, or None."""
+    # ilike is case-insensitive, so one entry serves every spelling
+    return _cache.get_or_fetch('res.partner', partner_name.casefold(), lambda: _first(
+        client, 'res.partner', [('name', 'ilike', partner_name)], ['id', 'name']))
+
+
+def _find_account(client, account_type):
+    return _cache.get_or_fetch('account.account', account_type, lambda: _first(
+        client, 'account.account', [('account_type', '=', account_type)], ['id']))
+
+
+def _find_journal(client, journal_type):
+    return _cache.get_or_fetch('account.journal', journal_type, lambda: _first(
+        client, 'account.journal', [('type', '=', journal_type)], ['id']))
+
+
+def _find_stage(client, stage_name):
+    return _cache.get_or_fetch('crm.stage', stage_name.casefold(), lambda: _first(
+        client, 'crm.stage', [('name', 'ilike', stage_name)], ['id', 'name']))
+
+
+def _or_domain(conditions):
+    """Combine leaf conditions with Odoo's prefix '|' operator."""
+    return ['|'] * (len(conditions) - 1) + conditions
+
+
+def _match_names(client, model, names, fields):
+    """Map each casefolded name to the first record of model it matches (ilike), or None.
+
+    All names are resolved with one search_read; rows come back in the
+    model's default order, so the first row containing a name is the same
+    record a per-name search with limit 1 would have returned. Empty names
+    are skipped, since they would match every record.
+    """
+    wanted = {name.casefold(): name for name in names if name}
+    if not wanted:
+        return {}
+    rows = client.execute_kw(model, 'search_read',
+        [_or_domain([('name', 'ilike', name) for name in wanted.values()])], {'fields': fields})
+    return {key: next((r for r in rows if key in r['name'].casefold()), None) for key in wanted}
+
+
+def _resolve_products(client, names):
+    """Map each product name to a product.product ID in one round-trip.
+
+    Raises ValueError listing every name that matched nothing.
+    """
+    products = _match_names(client, 'product.product', names, ['id', 'name'])
+    missing = [name for name in dict.fromkeys(names) if products.get(name.casefold()) is None]
+    if missing:
+        raise ValueError(f'Products not found: {", ".join(missing)}')
+    return {name: products[name.casefold()]['id'] for name in names}
+
+
+def _resolve_partners(client, names):
+    """Map casefolded partner names to partners (or None), fetching cache misses in one query."""
+    partners, todo = {}, []
+    for name in filter(None, names):
+        value = _cache.lookup('res.partner', name.casefold())
+        if value is _MISS:
+            todo.append(name)
+        else:
+            partners[name.casefold()] = value
+    for key, partner in _match_names(client, 'res.partner', todo, ['id', 'name']).items():
+        _cache.put('res.partner', key, partner)
+        partners[key] = partner
+    return partners
+
+
+def _invoice_accounts(client, invoice_type):
+    """Return (account_id, journal_id) for an invoice type."""
     # Find income/expense account
     if invoice_type == 'out_invoice':
         acc_type = 'income'
     else:
         acc_type = 'expense'
-    accounts = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'account.account', 'search_read',
-        [[('account_type', '=', acc_type)]], {'fields': ['id'], 'limit': 1})
-    account_id = accounts[0]['id']
+    account = _find_account(client, acc_type)
+    if not account:
+        raise ValueError(f'No {acc_type} account configured in Odoo')
 
     # Find journal
     journal_type = 'sale' if invoice_type == 'out_invoice' else 'purchase'
-    journals = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'account.journal', 'search_read',
-        [[('type', '=', journal_type)]], {'fields': ['id'], 'limit': 1})
-    journal_id = journals[0]['id']
-
-    # Build invoice lines
-    invoice_lines = []
-    for line in lines:
-        invoice_lines.append((0, 0, {
-            'name': line['description'],
-            'quantity': line.get('quantity', 1),
-            'price_unit': line['price_unit'],
-            'account_id': account_id,
-        }))
-
-    inv_id = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'account.move', 'create', [{
-        'move_type': invoice_type,
-        'partner_id': partner_id,
-        'journal_id': journal_id,
-        'invoice_line_ids': invoice_lines,
-    }])
+    journal = _find_journal(client, journal_type)
+    if not journal:
+        raise ValueError(f'No {journal_type} journal configured in Odoo')
+    return account['id'], journal['id']
+
+
+def _invoice_lines(lines, account_id):
+    return [(0, 0, {
+        'name': line['description'],
+        'quantity': line.get('quantity', 1),
+        'price_unit': line['price_unit'],
+        'account_id': account_id,
+    }) for line in lines]
+
+
+def _order_lines(lines, product_ids):
+    return [(0, 0, {
+        'product_id': product_ids[line['product_name']],
+        'product_uom_qty': line.get('quantity', 1),
+        'price_unit': line['price_unit'],
+    }) for line in lines]
+
+
+def create_invoice(partner_name, lines, invoice_type='out_invoice'):
+    """Create and post an invoice.
+
+    Args:
+        partner_name: Customer/vendor name (must exist in Odoo)
+        lines: List of dicts with keys: description, quantity, price_unit
+        invoice_type: 'out_invoice' (customer) or 'in_invoice' (vendor bill)
+
+    Returns: dict with invoice id, name, amount_total
+    """
+    client = get_client()
+
+    # Find partner
+    partner = _find_partner(client, partner_name)
+    if not partner:
+        raise ValueError(f'Partner not found: {partner_name}')
+    partner_id = partner['id']
+    account_id, journal_id = _invoice_accounts(client, invoice_type)
+    invoice_lines = _invoice_lines(lines, account_id)
+
+    with _invalidate_on_fault():
+        inv_id = client.execute_kw('account.move', 'create', [{
+            'move_type': invoice_type,
+            'partner_id': partner_id,
+            'journal_id': journal_id,
+            'invoice_line_ids': invoice_lines,
+        }])
 
     # Post it
-    models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'account.move', 'action_post', [[inv_id]])
+    client.execute_kw('account.move', 'action_post', [[inv_id]])
 
-    inv = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'account.move', 'search_read',
+    inv = client.execute_kw('account.move', 'search_read',
         [[('id', '=', inv_id)]], {'fields': ['name', 'amount_total', 'state']})
     return inv[0]
 
@@ -85,7 +472,7 @@ def create_crm_lead(name, partner_name=None, expected_revenue=0, description='',
 
     Returns: dict with lead id, name
     """
-    uid, models = _connect()
+    client = get_client()
 
     vals = {
         'name': name,
@@ -95,13 +482,13 @@ def create_crm_lead(name, partner_name=None, expected_revenue=0, description='',
     }
 
     if partner_name:
-        partners = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'res.partner', 'search_read',
-            [[('name', 'ilike', partner_name)]], {'fields': ['id'], 'limit': 1})
-        if partners:
-            vals['partner_id'] = partners[0]['id']
+        partner = _find_partner(client, partner_name)
+        if partner:
+            vals['partner_id'] = partner['id']
 
-    lead_id = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'crm.lead', 'create', [vals])
-    lead = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'crm.lead', 'search_read',
+    with _invalidate_on_fault():
+        lead_id = client.execute_kw('crm.lead', 'create', [vals])
+    lead = client.execute_kw('crm.lead', 'search_read',
         [[('id', '=', lead_id)]], {'fields': ['name', 'stage_id']})
     return lead[0]
 
@@ -115,33 +502,24 @@ def create_sale_order(partner_name, lines):
 
     Returns: dict with order id, name, amount_total
     """
-    uid, models = _connect()
+    client = get_client()
 
-    partners = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'res.partner', 'search_read',
-        [[('name', 'ilike', partner_name)]], {'fields': ['id'], 'limit': 1})
-    if not partners:
+    partner = _find_partner(client, partner_name)
+    if not partner:
         raise ValueError(f'Partner not found: {partner_name}')
 
-    order_lines = []
-    for line in lines:
-        products = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'product.product', 'search_read',
-            [[('name', 'ilike', line['product_name'])]], {'fields': ['id'], 'limit': 1})
-        if not products:
-            raise ValueError(f'Product not found: {line["product_name"]}')
-        order_lines.append((0, 0, {
-            'product_id': products[0]['id'],
-            'product_uom_qty': line.get('quantity', 1),
-            'price_unit': line['price_unit'],
-        }))
-
-    so_id = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'sale.order', 'create', [{
-        'partner_id': partners[0]['id'],
-        'order_line': order_lines,
-    }])
-
-    models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'sale.order', 'action_confirm', [[so_id]])
-
-    so = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'sale.order', 'search_read',
+    product_ids = _resolve_products(client, [line['product_name'] for line in lines])
+    order_lines = _order_lines(lines, product_ids)
+
+    with _invalidate_on_fault():
+        so_id = client.execute_kw('sale.order', 'create', [{
+            'partner_id': partner['id'],
+            'order_line': order_lines,
+        }])
+
+    client.execute_kw('sale.order', 'action_confirm', [[so_id]])
+
+    so = client.execute_kw('sale.order', 'search_read',
         [[('id', '=', so_id)]], {'fields': ['name', 'amount_total', 'state']})
     return so[0]
 
@@ -151,19 +529,209 @@ def update_crm_stage(lead_name, stage_name):
 
     Returns: dict with lead id, name, new stage
     """
-    uid, models = _connect()
+    client = get_client()
 
-    leads = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'crm.lead', 'search_read',
+    leads = client.execute_kw('crm.lead', 'search_read',
         [[('name', 'ilike', lead_name)]], {'fields': ['id', 'name'], 'limit': 1})
     if not leads:
         raise ValueError(f'Lead not found: {lead_name}')
 
-    stages = models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'crm.stage', 'search_read',
-        [[('name', 'ilike', stage_name)]], {'fields': ['id', 'name'], 'limit': 1})
-    if not stages:
+    stage = _find_stage(client, stage_name)
+    if not stage:
         raise ValueError(f'Stage not found: {stage_name}')
 
-    models.execute_kw(ODOO_DB, uid, ODOO_PASS, 'crm.lead', 'write',
-        [[leads[0]['id']], {'stage_id': stages[0]['id']}])
+    with _invalidate_on_fault():
+        client.execute_kw('crm.lead', 'write',
+            [[leads[0]['id']], {'stage_id': stage['id']}])
 
-    return {'id': leads[0]['id'], 'name': leads[0]['name'], 'stage': stages[0]['name']}
+    return {'id': leads[0]['id'], 'name': leads[0]['name'], 'stage': stage['name']}
+
+
+def _create_many(client, model, vals_list):
+    """Create records in one call; returns [(id, error)] aligned with vals_list.
+
+    Odoo rolls back the whole call on error, so if the batch is rejected
+    the records are retried one by one to pin the failure on the bad items.
+    """
+    if not vals_list:
+        return []
+    try:
+        with _invalidate_on_fault():
+            ids = client.execute_kw(model, 'create', [vals_list])
+        return [(record_id, None) for record_id in ids]
+    except xmlrpc.client.Fault:
+        pass
+    results = []
+    for vals in vals_list:
+        try:
+            results.append((client.execute_kw(model, 'create', [vals]), None))
+        except xmlrpc.client.Fault as e:
+            results.append((None, e.faultString))
+    return results
+
+
+def _call_many(client, model, method, ids):
+    """Run a workflow method on every record in one call; returns {id: error} for failures."""
+    if not ids:
+        return {}
+    try:
+        client.execute_kw(model, method, [ids])
+        return {}
+    except xmlrpc.client.Fault:
+        pass
+    errors = {}
+    for record_id in ids:
+        try:
+            client.execute_kw(model, method, [[record_id]])
+        except xmlrpc.client.Fault as e:
+            errors[record_id] = e.faultString
+    return errors
+
+
+def _bulk_create(client, model, prepared, fields, confirm=None):
+    """Create (and optionally confirm) prepared records in batch.
+
+    prepared holds either a vals dict or an error message per input item.
+    Returns one dict per item: the record's id and fields, or an 'error'.
+    """
+    results = [{'index': i, 'error': p} for i, p in enumerate(prepared)]
+    todo = [i for i, p in enumerate(prepared) if isinstance(p, dict)]
+    ids = {}
+    for i, (record_id, error) in zip(todo, _create_many(client, model, [prepared[i] for i in todo])):
+        if error:
+            results[i] = {'index': i, 'error': error}
+        else:
+            ids[i] = record_id
+
+    if confirm:
+        failed = _call_many(client, model, confirm, list(ids.values()))
+        for i, record_id in list(ids.items()):
+            if record_id in failed:
+                results[i] = {'index': i, 'id': record_id, 'error': f'Created but {confirm} failed: {failed[record_id]}'}
+                del ids[i]
+
+    if ids:
+        rows = client.execute_kw(model, 'search_read',
+            [[('id', 'in', list(ids.values()))]], {'fields': fields})
+        by_id = {row['id']: row for row in rows}
+        for i, record_id in ids.items():
+            results[i] = {'index': i, **by_id[record_id]}
+    return results
+
+
+def _field_values(items, key):
+    """String values of key across items, skipping malformed ones; build() reports those."""
+    return [item[key] for item in items if isinstance(item, dict) and isinstance(item.get(key), str)]
+
+
+def _all_lines(items):
+    return [line for item in items if isinstance(item, dict) and isinstance(item.get('lines'), list)
+            for line in item['lines']]
+
+
+def _prepare(items, build):
+    """Build vals for each item, recording validation errors instead of raising."""
+    prepared = []
+    for item in items:
+        try:
+            prepared.append(build(item))
+        except KeyError as e:
+            prepared.append(f'Missing field: {e}')
+        except ValueError as e:
+            prepared.append(str(e))
+        except (TypeError, AttributeError) as e:
+            # e.g. an item or line that is not a dict, or a name that is not a string
+            prepared.append(f'Malformed item: {e}')
+    return prepared
+
+
+def create_invoices(invoices):
+    """Create and post many invoices with one create and one action_post call.
+
+    Args:
+        invoices: List of dicts with keys: partner_name, lines (as for
+            create_invoice) and optional invoice_type
+
+    Returns: list of dicts in input order, each with index plus either the
+    invoice's id, name, amount_total, state or an error message
+    """
+    client = get_client()
+    partners = _resolve_partners(client, _field_values(invoices, 'partner_name'))
+
+    def build(inv):
+        partner = partners.get(inv['partner_name'].casefold())
+        if not partner:
+            raise ValueError(f'Partner not found: {inv["partner_name"]}')
+        invoice_type = inv.get('invoice_type', 'out_invoice')
+        account_id, journal_id = _invoice_accounts(client, invoice_type)
+        return {
+            'move_type': invoice_type,
+            'partner_id': partner['id'],
+            'journal_id': journal_id,
+            'invoice_line_ids': _invoice_lines(inv['lines'], account_id),
+        }
+
+    return _bulk_create(client, 'account.move', _prepare(invoices, build),
+        ['name', 'amount_total', 'state'], confirm='action_post')
+
+
+def create_crm_leads(leads):
+    """Create many CRM leads/opportunities with one create call.
+
+    Args:
+        leads: List of dicts with keys: name and optional partner_name,
+            expected_revenue, description, lead_type
+
+    Returns: list of dicts in input order, each with index plus either the
+    lead's id, name, stage_id or an error message
+    """
+    client = get_client()
+    partners = _resolve_partners(client, _field_values(leads, 'partner_name'))
+
+    def build(lead):
+        vals = {
+            'name': lead['name'],
+            'expected_revenue': lead.get('expected_revenue', 0),
+            'description': lead.get('description', ''),
+            'type': lead.get('lead_type', 'opportunity'),
+        }
+        partner = partners.get((lead.get('partner_name') or '').casefold())
+        if partner:
+            vals['partner_id'] = partner['id']
+        return vals
+
+    return _bulk_create(client, 'crm.lead', _prepare(leads, build), ['name', 'stage_id'])
+
+
+def create_sale_orders(orders):
+    """Create and confirm many sales orders with one create and one action_confirm call.
+
+    Partners and products for every order are resolved up front, one query each.
+
+    Args:
+        orders: List of dicts with keys: partner_name, lines (as for
+            create_sale_order)
+
+    Returns: list of dicts in input order, each with index plus either the
+    order's id, name, amount_total, state or an error message
+    """
+    client = get_client()
+    partners = _resolve_partners(client, _field_values(orders, 'partner_name'))
+    names = _field_values(_all_lines(orders), 'product_name')
+    products = _match_names(client, 'product.product', names, ['id', 'name'])
+
+    def build(order):
+        partner = partners.get(order['partner_name'].casefold())
+        if not partner:
+            raise ValueError(f'Partner not found: {order["partner_name"]}')
+        missing = [l['product_name'] for l in order['lines'] if products.get(l['product_name'].casefold()) is None]
+        if missing:
+            raise ValueError(f'Products not found: {", ".join(dict.fromkeys(missing))}')
+        product_ids = {l['product_name']: products[l['product_name'].casefold()]['id'] for l in order['lines']}
+        return {
+            'partner_id': partner['id'],
+            'order_line': _order_lines(order['lines'], product_ids),
+        }
+
+    return _bulk_create(client, 'sale.order', _prepare(orders, build),
+        ['name', 'amount_total', 'state'], confirm='action_confirm')
@@ -48,6 +48,7 @@ def execute_approved(filepath):
         f"Respond in this exact JSON format (no markdown, no backticks):\n"
         f'{{"action": "reply_email"|"send_email"|"send_whatsapp"|"create_invoice"|"create_crm_lead"|"create_sale_order"|"update_crm_stage"|"no_action", '
         f'"to": "recipient", "subject": "subject", "body": "message body", "message_id": "id if replying", '
+        f'"account": "WhatsApp account from the source frontmatter, if any", '
         f'"partner_name": "Odoo partner name", "lines": [{{"description":"item","quantity":1,"price_unit":100}}], '
         f'"lead_name": "CRM lead name", "stage_name": "stage name", '
         f'"expected_revenue": 0, "lead_type": "opportunity|lead", '
@@ -101,7 +102,7 @@ def execute_approved(filepath):
                     audit_logger.log_action("send_email", "orchestrator", decision['to'], {"subject": decision['subject'], "source": filepath.name}, "approved", "success")
                 elif action == 'send_whatsapp':
                     import whatsapp_utils
-                    whatsapp_utils.send_message(decision['to'], decision['body'])
+                    whatsapp_utils.send_message(decision['to'], decision['body'], account=decision.get('account') or None)
                     output = f"Sent WhatsApp to {decision['to']}: {decision['reason']}"
                     audit_logger.log_action("send_whatsapp", "orchestrator", decision['to'], {"source": filepath.name}, "approved", "success")
                 elif action == 'create_invoice':
@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import odoo_sync
+
+
+def product(qty, **fields):
+    return {'id': 7, 'name': 'Desk Lamp', 'default_code': 'LAMP', 'qty_available': qty,
+            'list_price': 40.0, 'type': 'product', 'write_date': '2026-10-01 12:00:00', **fields}
+
+
+class ProductEventTest(unittest.TestCase):
+    def test_out_of_stock(self):
+        events = odoo_sync.change_events('inventory', [(product(3.0), product(0.0))])
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['event'], 'qty_available')
+        self.assertEqual((events[0]['from'], events[0]['to']), (3.0, 0.0))
+        self.assertEqual(events[0]['summary'], 'product Desk Lamp is out of stock')
+
+    def test_back_in_stock(self):
+        events = odoo_sync.change_events('inventory', [(product(0.0), product(12.0))])
+        self.assertEqual([e['summary'] for e in events], ['product Desk Lamp back in stock (12.0 units)'])
+
+    def test_quantity_change_above_zero_is_quiet(self):
+        self.assertEqual(odoo_sync.change_events('inventory', [(product(5.0), product(4.0))]), [])
+
+    def test_services_are_ignored(self):
+        self.assertEqual(odoo_sync.change_events('inventory', [(product(3.0, type='service'),
+                                                                product(0.0, type='service'))]), [])
+
+
+class FakeClient:
+    """Serves products for the write_date sync and the qty_available refresh."""
+
+    def __init__(self, products):
+        self.products = products
+
+    def execute_kw(self, model, method, args, kwargs):
+        domain = args[0]
+        if domain and domain[0][0] == 'id':
+            rows = [p for p in self.products if p['id'] > domain[0][2]]
+        elif domain:
+            rows = [p for p in self.products if p['write_date'] > '2026-10-01 12:00:00']
+        else:
+            rows = self.products
+        fields = kwargs['fields']
+        return [{k: v for k, v in p.items() if k in fields or k == 'id'} for p in rows][:kwargs['limit']]
+
+
+class StockRefreshTest(unittest.TestCase):
+    def test_quantity_change_without_write_date_bump_is_synced(self):
+        client = FakeClient([product(3.0)])
+        with tempfile.TemporaryDirectory() as tmp:
+            store = odoo_sync.SyncStore(Path(tmp) / 'store.db')
+            odoo_sync.sync(client, store, 'inventory')
+            # A delivery validates a stock move; the product's write_date stays put
+            client.products = [product(0.0)]
+            changes = odoo_sync.sync(client, store, 'inventory')
+            self.assertEqual(store.records('product.product')[0]['qty_available'], 0.0)
+            events = odoo_sync.change_events('inventory', changes)
+            self.assertEqual([e['summary'] for e in events], ['product Desk Lamp is out of stock'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""Cross-process OAuth token manager for the Gmail token file.
+
+The Gmail watcher, the MCP server (via gmail_utils) and the orchestrator all
+share gmail_token.json. TokenManager refreshes the token in a background
+thread before it expires, serializes refreshes across processes with an
+exclusive file lock, and publishes the new token with an atomic rename so
+readers never see a half-written file. Callers on the hot path only pay for
+a stat() to pick up tokens refreshed by another process.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MARGIN = 300  # refresh when fewer than this many seconds of validity remain
+CHECK_INTERVAL = 60  # seconds between background expiry checks
+MAX_BACKOFF = 900  # cap on retry delay after failed background refreshes
+
+
+class TokenUnavailableError(RuntimeError):
+    """Raised when no usable token exists and one cannot be obtained."""
+
+
+def _scopes_match(token_path, required_scopes):
+    """Check if saved token has all required scopes."""
+    try:
+        data = json.loads(token_path.read_text())
+        saved = set(data.get('scopes', []))
+        return set(required_scopes).issubset(saved)
+    except Exception:
+        return False
+
+
+class TokenManager:
+    def __init__(self, token_file, client_secret, scopes):
+        self.token_file = Path(token_file)
+        self.lock_file = self.token_file.with_suffix('.lock')
+        self.client_secret = Path(client_secret)
+        self.scopes = scopes
+        self._creds = None
+        self._mtime = None
+        self._lock = threading.Lock()  # guards _creds/_mtime; never held across network calls
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold an exclusive lock shared by every process using the token file."""
+        with open(self.lock_file, 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _reload(self):
+        """Re-read the token file if it changed since the last read."""
+        try:
+            mtime = self.token_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        if not _scopes_match(self.token_file, self.scopes):
+            logger.info('Token scopes changed, re-authentication required')
+            self._creds = None
+            return
+        self._creds = Credentials.from_authorized_user_file(str(self.token_file), self.scopes)
+
+    def _publish(self, creds):
+        """Write the token atomically; caller holds the file lock and _lock."""
+        tmp = self.token_file.with_name(f'{self.token_file.name}.{os.getpid()}.tmp')
+        tmp.write_text(creds.to_json())
+        os.replace(tmp, self.token_file)
+        self._mtime = self.token_file.stat().st_mtime_ns
+        self._creds = creds
+
+    @staticmethod
+    def _seconds_left(creds):
+        if creds.expiry is None:
+            return float('inf')
+        # google-auth stores expiry as naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return (creds.expiry - now).total_seconds()
+
+    def refresh(self, force=False, margin=REFRESH_MARGIN):
+        """Refresh the token unless another process already did.
+
+        Returns the fresh credentials. Raises TokenUnavailableError if there
+        is no refresh token or the refresh itself fails.
+        """
+        with self._refresh_lock, self._file_lock():
+            with self._lock:
+                self._reload()
+                creds = self._creds
+            if creds is None or not creds.refresh_token:
+                raise TokenUnavailableError('No refreshable Gmail token on disk')
+            if not force and creds.valid and self._seconds_left(creds) > margin:
+                return creds
+            try:
+                creds.refresh(Request())
+            except Exception as e:
+                raise TokenUnavailableError(f'Token refresh failed: {e}') from e
+            with self._lock:
+                self._publish(creds)
+            logger.info(f'Gmail token refreshed, valid until {creds.expiry}')
+            return creds
+
+    def _authorize(self):
+        """Run the interactive OAuth flow; headless processes cannot do this."""
+        if not sys.stdin.isatty():
+            raise TokenUnavailableError(
+                'Gmail token is missing or expired and cannot re-authenticate in headless mode. '
+                'Run manually: cd watchers && .venv/bin/python gmail_watcher.py'
+            )
+        flow = InstalledAppFlow.from_client_secrets_file(str(self.client_secret), self.scopes)
+        creds = flow.run_local_server(port=8090, open_browser=False)
+        with self._refresh_lock, self._file_lock(), self._lock:
+            self._publish(creds)
+        return creds
+
+    def get_credentials(self):
+        """Return valid credentials, normally without any network round-trip."""
+        with self._lock:
+            self._reload()
+            creds = self._creds
+        if creds is None:
+            return self._authorize()
+        if not creds.valid:
+            # Background refresh fell behind (e.g. machine was asleep)
+            try:
+                return self.refresh()
+            except TokenUnavailableError:
+                if not creds.refresh_token:
+                    return self._authorize()
+                raise
+        return creds
+
+    def start(self):
+        """Start the background refresh thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        delay = CHECK_INTERVAL
+        while True:
+            time.sleep(delay)
+            try:
+                with self._lock:
+                    self._reload()
+                    creds = self._creds
+                # Refresh one check early so the token never lapses between checks
+                margin = REFRESH_MARGIN + CHECK_INTERVAL
+                if creds is not None and self._seconds_left(creds) <= margin:
+                    self.refresh(margin=margin)
+                delay = CHECK_INTERVAL
+            except Exception as e:
+                delay = min(delay * 2, MAX_BACKOFF)
+                logger.error(f'Background token refresh failed, retrying in {delay}s: {e}')
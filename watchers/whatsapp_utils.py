@@ -1,20 +1,268 @@
+"""WhatsApp outbox queue shared by the MCP server/orchestrator and the watcher.
+
+Messages are stored in a SQLite database (WAL mode) under wa_outbox/.
+Producers call send_message(); the watcher claims due messages, then acks
+or nacks each one. Failed sends are retried with exponential backoff and
+dead-lettered after MAX_ATTEMPTS. Claims are leased, so messages held by a
+watcher that crashed become claimable again after LEASE_SECONDS.
+
+Right before pressing Enter the watcher marks a message 'submitting'. A
+send that fails from then on may still have been delivered, so it is
+marked 'unconfirmed' and never retried automatically; a 'submitting'
+message whose lease expires (the watcher died mid-send) is moved to
+'unconfirmed' by the next claim instead of being sent again. Dead and
+unconfirmed messages are listed by dead_letters() and the
+whatsapp_failed_messages MCP tool.
+
+Every message belongs to a WhatsApp account; the watcher only claims
+messages for the accounts it is logged in to.
+"""
+
 import json
+import logging
+import re
+import sqlite3
 import time
+from contextlib import contextmanager
 from pathlib import Path
 
+from config import get_whatsapp_config
+
+logger = logging.getLogger(__name__)
+
 VAULT = Path(__file__).parent.parent
 OUTBOX = VAULT / 'wa_outbox'
+QUEUE_DB = OUTBOX / 'queue.db'
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 30  # seconds before the first retry; doubles per attempt
+BACKOFF_MAX = 3600
+LEASE_SECONDS = 300
+DEFAULT_ACCOUNT = 'default'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    contact TEXT NOT NULL,
+    contact_key TEXT NOT NULL,
+    message TEXT NOT NULL,
+    account TEXT NOT NULL DEFAULT 'default',
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    created_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT
+);
+"""
+# Created after the account column migration so old databases get it too
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_outbox_account_due ON outbox (account, status, priority DESC, id);
+DROP INDEX IF EXISTS idx_outbox_due;
+"""
+
+_initialized = False
+
+
+def is_phone_number(contact):
+    """Check if contact is a phone number (digits, +, spaces, dashes)."""
+    cleaned = re.sub(r'[\s\-\(\)]', '', contact)
+    return bool(re.match(r'^\+?\d{7,15}$', cleaned))
 
 
-def send_message(contact: str, message: str) -> Path:
+def normalize_phone(contact):
+    """Strip non-digit chars except leading +."""
+    cleaned = re.sub(r'[\s\-\(\)]', '', contact)
+    return cleaned
+
+
+def contact_key(contact):
+    """Normalize a contact so messages for the same chat group together."""
+    if is_phone_number(contact):
+        return normalize_phone(contact).lstrip('+')
+    return contact.strip().casefold()
+
+
+def account_names(cfg=None):
+    """Configured account names, primary first; 'default' when none are configured."""
+    cfg = cfg or get_whatsapp_config()
+    return [a['name'] for a in cfg.get('accounts', [])] or [DEFAULT_ACCOUNT]
+
+
+@contextmanager
+def _connect():
+    global _initialized
+    OUTBOX.mkdir(exist_ok=True)
+    conn = sqlite3.connect(QUEUE_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(outbox)')}
+            if 'account' not in columns:
+                conn.execute(f"ALTER TABLE outbox ADD COLUMN account TEXT NOT NULL DEFAULT '{DEFAULT_ACCOUNT}'")
+            conn.executescript(INDEXES)
+            _initialized = True
+        conn.execute('PRAGMA synchronous=NORMAL')
+        yield conn
+    finally:
+        conn.close()
+
+
+def send_message(contact: str, message: str, priority: int = 0, account: str = None) -> int:
     """Queue a WhatsApp message for sending via the watcher process.
 
-    Writes a JSON request file to wa_outbox/ that the watcher picks up.
-    Returns the path of the created request file.
+    Higher priority messages are sent first. account selects the sending
+    WhatsApp account and defaults to the primary one. Returns the queue ID.
     """
-    OUTBOX.mkdir(exist_ok=True)
-    request = {"contact": contact, "message": message}
-    filename = f"SEND_{int(time.time() * 1000)}.json"
-    filepath = OUTBOX / filename
-    filepath.write_text(json.dumps(request))
-    return filepath
+    names = account_names()
+    account = account or names[0]
+    if account not in names:
+        raise ValueError(f'Unknown WhatsApp account {account!r}; configured: {", ".join(names)}')
+    now = time.time()
+    with _connect() as conn:
+        cur = conn.execute(
+            'INSERT INTO outbox (contact, contact_key, message, account, priority, next_attempt_at, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (contact, contact_key(contact), message, account, priority, now, now),
+        )
+        return cur.lastrowid
+
+
+def claim(account=DEFAULT_ACCOUNT, limit=100, lease=LEASE_SECONDS):
+    """Atomically claim up to limit due messages for an account, highest priority first.
+
+    The primary account also picks up messages queued before accounts were
+    configured, which carry the 'default' account. A message is held back
+    while an earlier message to the same contact waits for its retry, so a
+    contact's messages are always delivered in the order they were queued.
+    """
+    accounts = {account}
+    if account == account_names()[0]:
+        accounts.add(DEFAULT_ACCOUNT)
+    placeholders = ', '.join('?' * len(accounts))
+    now = time.time()
+    with _connect() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # A watcher that died mid-send may have delivered these; never re-send them
+            orphaned = conn.execute(
+                f"UPDATE outbox SET status = 'unconfirmed', claimed_at = NULL, "
+                f"last_error = 'watcher stopped while submitting' "
+                f"WHERE account IN ({placeholders}) AND status = 'submitting' AND claimed_at <= ?",
+                (*accounts, now - lease),
+            ).rowcount
+            rows = conn.execute(
+                f"SELECT * FROM outbox WHERE account IN ({placeholders}) AND ("
+                "   (status = 'pending' AND next_attempt_at <= ?) "
+                "   OR (status = 'claimed' AND claimed_at <= ?)) "
+                "AND NOT EXISTS (SELECT 1 FROM outbox AS earlier "
+                "   WHERE earlier.account = outbox.account AND earlier.contact_key = outbox.contact_key "
+                "   AND earlier.id < outbox.id AND earlier.status = 'pending' AND earlier.next_attempt_at > ?) "
+                "ORDER BY priority DESC, id LIMIT ?",
+                (*accounts, now, now - lease, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = 'claimed', claimed_at = ? WHERE id = ?",
+                [(now, r['id']) for r in rows],
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    if orphaned:
+        logger.error(f'{orphaned} WhatsApp message(s) were being submitted when the watcher stopped; '
+                     f'marked unconfirmed')
+    return [dict(r) for r in rows]
+
+
+def mark_submitting(msg_id):
+    """Record that a claimed message is about to be submitted; call right before sending."""
+    with _connect() as conn:
+        conn.execute("UPDATE outbox SET status = 'submitting' WHERE id = ?", (msg_id,))
+
+
+def ack(msg_id):
+    """Mark a claimed message as sent."""
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+            (time.time(), msg_id),
+        )
+
+
+def release(msg_id):
+    """Return a claimed message to the queue untried, without counting an attempt."""
+    with _connect() as conn:
+        conn.execute("UPDATE outbox SET status = 'pending', claimed_at = NULL WHERE id = ?", (msg_id,))
+
+
+def nack(msg_id, error):
+    """Record a failed attempt; schedule a retry or dead-letter the message.
+
+    Returns the message's new status ('pending' or 'dead').
+    """
+    now = time.time()
+    with _connect() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT attempts FROM outbox WHERE id = ?', (msg_id,)).fetchone()
+            attempts = row['attempts'] + 1
+            if attempts >= MAX_ATTEMPTS:
+                status, next_at = 'dead', now
+            else:
+                status = 'pending'
+                next_at = now + min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+            conn.execute(
+                'UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, '
+                'claimed_at = NULL, last_error = ? WHERE id = ?',
+                (status, attempts, next_at, str(error), msg_id),
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    if status == 'dead':
+        logger.error(f'WhatsApp message {msg_id} dead-lettered after {attempts} attempts: {error}')
+    return status
+
+
+def mark_unconfirmed(msg_id, error):
+    """Park a message that may have been delivered; it is never claimed again."""
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE outbox SET status = 'unconfirmed', claimed_at = NULL, last_error = ? WHERE id = ?",
+            (str(error), msg_id),
+        )
+    logger.error(f'WhatsApp message {msg_id} may have been sent but was not confirmed: {error}')
+
+
+def dead_letters(limit=50):
+    """Return the most recent dead-lettered and unconfirmed messages."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM outbox WHERE status IN ('dead', 'unconfirmed') ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def import_legacy_files():
+    """Move SEND_*.json requests from the old file-per-message outbox into the queue."""
+    if not OUTBOX.exists():
+        return 0
+    count = 0
+    for filepath in sorted(OUTBOX.glob('SEND_*.json')):
+        try:
+            request = json.loads(filepath.read_text(encoding='utf-8-sig'))
+            send_message(request['contact'], request['message'])
+        except Exception as e:
+            logger.error(f'Could not import legacy send request {filepath.name}: {e}')
+            continue
+        filepath.unlink()
+        count += 1
+    if count:
+        logger.info(f'Imported {count} legacy outbox file(s) into the queue')
+    return count
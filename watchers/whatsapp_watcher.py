@@ -1,17 +1,22 @@
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 from config import get_whatsapp_config
 from notifier import notify
-import json, re, shutil, threading, time, signal, logging
+import whatsapp_utils
+import asyncio, hashlib, json, os, re, shutil, threading, time, signal, logging
 
 logging.basicConfig(level=logging.INFO)
 
 WATCHER_DIR = Path(__file__).parent
 VAULT = WATCHER_DIR.parent
-# Store session on Linux filesystem for reliable persistence
-SESSION = Path.home() / '.whatsapp_session'
+# Store sessions on Linux filesystem for reliable persistence
+SESSIONS = Path.home() / '.whatsapp_sessions'
+# Persistent Chromium profile used before multi-account support
+LEGACY_SESSION = Path.home() / '.whatsapp_session'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
 QR_SCREENSHOT = VAULT / 'whatsapp_qr.png'
 
 QR_PAGE = '''<!DOCTYPE html><html><head><title>WhatsApp QR</title>
@@ -48,6 +53,9 @@ class QRHandler(SimpleHTTPRequestHandler):
         pass
 
 
+_qr_server_started = False
+
+
 def serve_qr():
     server = HTTPServer(('0.0.0.0', 8095), QRHandler)
     server.serve_forever()
@@ -70,194 +78,631 @@ def _check_message(text_lower, contact_name, cfg):
     return [kw for kw in keywords if kw in text_lower]
 
 
-OUTBOX = VAULT / 'wa_outbox'
-OUTBOX_SENT = OUTBOX / 'sent'
-OUTBOX_FAILED = OUTBOX / 'failed'
-
-
-def _is_phone_number(contact):
-    """Check if contact is a phone number (digits, +, spaces, dashes)."""
-    cleaned = re.sub(r'[\s\-\(\)]', '', contact)
-    return bool(re.match(r'^\+?\d{7,15}$', cleaned))
-
-
-def _normalize_phone(contact):
-    """Strip non-digit chars except leading +."""
-    cleaned = re.sub(r'[\s\-\(\)]', '', contact)
-    return cleaned
-
-
-def _process_outbox(page):
-    """Process pending send requests from wa_outbox/."""
-    if not OUTBOX.exists():
-        return
-    for filepath in sorted(OUTBOX.glob('SEND_*.json')):
+# Resource types aborted in lean mode; the chat list and QR canvas need none of them
+DEFAULT_BLOCKED_TYPES = ['image', 'media', 'font']
+CURSOR_FILE = WATCHER_DIR / 'wa_cursors.json'
+# Message rows carry data-id="<fromMe>_<chat jid>_<message id>"
+MESSAGE_DATA_ID = re.compile(r'^(?:true|false)_([^_]+)_(.+)$')
+
+# Returns one entry per unread chat: its title, full row text, unread count
+# and any WhatsApp data-id found on or inside the row.
+EXTRACT_UNREAD_JS = """
+() => {
+  const chats = new Map();
+  for (const el of document.querySelectorAll('[aria-label*="unread"]')) {
+    const row = el.closest('[role="listitem"], [role="row"]') || el;
+    const text = row.innerText || '';
+    const titleEl = row.querySelector('span[title]');
+    const title = titleEl ? titleEl.getAttribute('title') : text.split('\\n')[0];
+    const idEl = row.closest('[data-id]') || row.querySelector('[data-id]');
+    const unread = parseInt((el.getAttribute('aria-label') || '').match(/\\d+/)?.[0] || '0', 10);
+    // The last-message span carries the full preview as its title; otherwise
+    // take the longest row line that is not the chat title or the unread count
+    const previewEl = row.querySelectorAll('span[title]')[1];
+    const preview = previewEl ? previewEl.getAttribute('title') : text.split('\\n').slice(1)
+      .filter(line => !/^\\d+$/.test(line.trim()))
+      .reduce((a, b) => (b.length > a.length ? b : a), '');
+    chats.set(title, {title, text, preview, unread, dataId: idEl ? idEl.getAttribute('data-id') : ''});
+  }
+  return Array.from(chats.values());
+}
+""".strip()
+
+# Watches the chat list and pushes unread chats to Python via the
+# __waUnreadChanged binding. Mutations are debounced and only reported when
+# the set of unread chats actually changes.
+UNREAD_OBSERVER_JS = """
+(() => {
+  if (window.__waObserverInstalled) return;
+  window.__waObserverInstalled = true;
+  const extract = %s;
+  let observed = null, last = '', timer = null;
+  const report = () => {
+    timer = null;
+    const chats = extract();
+    const sig = JSON.stringify(chats);
+    if (sig === last) return;
+    last = sig;
+    if (chats.length && window.__waUnreadChanged) window.__waUnreadChanged(chats);
+  };
+  const schedule = () => { if (!timer) timer = setTimeout(report, 300); };
+  const observer = new MutationObserver(schedule);
+  const attach = () => {
+    const list = document.querySelector('[aria-label="Chat list"]');
+    if (!list || list === observed) return;
+    observer.disconnect();
+    observer.observe(list, {subtree: true, childList: true, characterData: true,
+                            attributes: true, attributeFilter: ['aria-label']});
+    observed = list;
+    schedule();
+  };
+  // WhatsApp re-renders the chat list on some navigations; re-attach when it is replaced
+  new MutationObserver(() => { if (!observed || !observed.isConnected) attach(); })
+    .observe(document, {childList: true, subtree: true});
+  attach();
+})();
+""" % EXTRACT_UNREAD_JS
+
+
+def _message_identity(chat):
+    """Return (chat_key, message_id) for an unread chat entry.
+
+    Prefers WhatsApp's own data-id; otherwise the chat is keyed by its title
+    and the message by a fingerprint of the chat and its preview text. The
+    time label ("10:42" becoming "Yesterday") and the unread count are left
+    out, so the same message keeps its id while those change.
+    """
+    match = MESSAGE_DATA_ID.match(chat.get('dataId') or '')
+    if match:
+        return match.group(1), match.group(2)
+    chat_key = chat.get('dataId') or chat['title']
+    preview = chat.get('preview') or chat['text']
+    digest = hashlib.sha1(f'{chat_key}\0{preview}'.encode()).hexdigest()
+    return chat_key, digest[:16]
+
+
+def _load_cursors(path):
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_cursors(cursors, path):
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(cursors, indent=2))
+    tmp.replace(path)
+
+
+COMPOSE_BOX = 'div[role="textbox"][aria-label^="Type to"]'
+SEARCH_BOX = 'div[role="textbox"][aria-label="Search input textbox"]'
+SEARCH_RESULT = 'span[title]'
+# Status icons WhatsApp shows on an outgoing message once it has left the phone
+SENT_TICK = '[data-icon="msg-check"], [data-icon="msg-dblcheck"], [data-icon="msg-dblcheck-ack"]'
+CHAT_OPEN_TIMEOUT = 30000  # ms; first load of a send?phone= URL can be slow
+STEP_TIMEOUT = 15000  # ms
+SETTLE_POLL = 0.15  # seconds between search-result checks
+
+
+@contextmanager
+def _timed(timings, step):
+    """Record how long a send step took, in seconds, under timings[step]."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[step] = time.monotonic() - start
+
+
+async def _find_contact_result(page, contact, timeout=STEP_TIMEOUT):
+    """Wait for a search result titled with the contact's name and return its locator.
+
+    span[title] also matches every row of the regular chat list, so rows are
+    matched on their title (case and surrounding whitespace ignored) rather
+    than by position; the top row may be a stale chat from before the
+    debounced search ran.
+    """
+    wanted = contact.strip().casefold()
+    results = page.locator(SEARCH_RESULT)
+    deadline = time.monotonic() + timeout / 1000
+    while time.monotonic() < deadline:
+        titles = await results.evaluate_all('els => els.map(e => e.getAttribute("title"))')
+        for title in titles:
+            if (title or '').strip().casefold() == wanted:
+                return page.locator(f'{SEARCH_RESULT}[title={json.dumps(title)}]').first
+        await asyncio.sleep(SETTLE_POLL)
+    raise TimeoutError(f'No chat titled {contact!r} in the search results')
+
+
+async def _open_chat(page, contact, timings):
+    """Open the chat for a contact name or phone number and wait for the compose box."""
+    if whatsapp_utils.is_phone_number(contact):
+        # Use direct URL for phone numbers (works for unsaved contacts)
+        phone_url = whatsapp_utils.normalize_phone(contact).lstrip('+')
+        with _timed(timings, 'navigate'):
+            await page.goto(f'https://web.whatsapp.com/send?phone={phone_url}')
+            await page.locator(COMPOSE_BOX).wait_for(state='visible', timeout=CHAT_OPEN_TIMEOUT)
+    else:
+        # Use search box for saved contact names
+        with _timed(timings, 'search'):
+            search = page.locator(SEARCH_BOX)
+            await search.click(force=True, timeout=STEP_TIMEOUT)
+            await search.fill(contact)
+            result = await _find_contact_result(page, contact)
+        with _timed(timings, 'open'):
+            await result.click(timeout=STEP_TIMEOUT)
+            await page.locator(COMPOSE_BOX).wait_for(state='visible', timeout=STEP_TIMEOUT)
+
+
+class SendUnconfirmed(Exception):
+    """The message was submitted but its delivery could not be confirmed."""
+
+
+async def _send_in_open_chat(page, msg, timings):
+    """Type and send a queued message in the open chat, waiting for WhatsApp's sent tick.
+
+    Errors up to pressing Enter are raised as is and the send can be
+    retried; anything from Enter on is raised as SendUnconfirmed, because
+    the message may already be on its way. The message is marked
+    'submitting' in the queue first, so a crash after Enter parks it as
+    unconfirmed instead of re-sending it.
+    """
+    outgoing = page.locator('div.message-out')
+    before = await outgoing.count()
+    with _timed(timings, 'compose'):
+        compose = page.locator(COMPOSE_BOX)
+        # click() waits for the box to be visible, enabled and stable
+        await compose.click(timeout=STEP_TIMEOUT)
+        await compose.fill(msg['message'])
+    await asyncio.to_thread(whatsapp_utils.mark_submitting, msg['id'])
+    try:
+        with _timed(timings, 'submit'):
+            await page.keyboard.press('Enter')
+        with _timed(timings, 'tick'):
+            await page.wait_for_function(
+                'n => document.querySelectorAll("div.message-out").length > n',
+                arg=before, timeout=STEP_TIMEOUT,
+            )
+            await outgoing.last.locator(SENT_TICK).first.wait_for(state='attached', timeout=STEP_TIMEOUT)
+    except Exception as e:
+        raise SendUnconfirmed(e) from e
+
+
+def _format_timings(timings):
+    return ' '.join(f'{k}={v:.2f}s' for k, v in timings.items())
+
+
+async def _park_unconfirmed(msg_id, error):
+    try:
+        await asyncio.to_thread(whatsapp_utils.mark_unconfirmed, msg_id, error)
+    except Exception as e:
+        logging.critical(f'Could not record message {msg_id} as possibly sent ({e}); '
+                         f'it will be marked unconfirmed when its claim lease expires')
+
+
+async def _process_outbox(page, account):
+    """Send due messages for an account from the outbox queue.
+
+    Messages for the same contact are batched: the chat is opened once and
+    every queued message is sent in order before moving on. Failures before
+    a message is submitted are nacked back to the queue, which retries them
+    with backoff, together with the rest of the contact's batch so nothing
+    overtakes them; later failures mark it unconfirmed so it is never re-sent.
+    """
+    batches = {}
+    for msg in await asyncio.to_thread(whatsapp_utils.claim, account):
+        batches.setdefault(msg['contact_key'], []).append(msg)
+
+    for batch in batches.values():
+        contact = batch[0]['contact']
+        timings = {}
+        logging.info(f'[{account}] Sending {len(batch)} message(s) to {contact}...')
         try:
-            request = json.loads(filepath.read_text(encoding='utf-8-sig'))
-            contact = request['contact']
-            message = request['message']
-            logging.info(f'Sending message to {contact}...')
-
-            if _is_phone_number(contact):
-                # Use direct URL for phone numbers (works for unsaved contacts)
-                phone = _normalize_phone(contact)
-                phone_url = phone.lstrip('+')
-                page.goto(f'https://web.whatsapp.com/send?phone={phone_url}')
-
-                # Wait for compose box (WhatsApp auto-opens the chat)
-                page.wait_for_selector('div[role="textbox"][aria-label^="Type to"]', timeout=30000)
-                time.sleep(1)
-            else:
-                # Use search box for saved contact names
-                search = page.locator('div[role="textbox"][aria-label="Search input textbox"]')
-                search.click(force=True)
-                time.sleep(0.5)
-                search.fill(contact)
-                time.sleep(3)
-
-                # Click the first visible search result (top span[title])
-                page.locator('span[title]').first.click()
-                time.sleep(2)
-
-            # Type message in compose box and send
-            compose = page.locator('div[role="textbox"][aria-label^="Type to"]')
-            compose.click(force=True)
-            time.sleep(0.5)
-            compose.fill(message)
-            page.keyboard.press('Enter')
-            time.sleep(2)
-
-            # Return to chat list
-            page.keyboard.press('Escape')
-            time.sleep(1)
-
-            # Move to sent/
-            OUTBOX_SENT.mkdir(parents=True, exist_ok=True)
-            result_data = {**request, 'status': 'sent', 'sent_at': datetime.now().isoformat()}
-            dest = OUTBOX_SENT / filepath.name
-            dest.write_text(json.dumps(result_data))
-            filepath.unlink()
-            logging.info(f'Message sent to {contact}, moved to sent/')
-
+            await _open_chat(page, contact, timings)
         except Exception as e:
-            logging.error(f'Failed to send {filepath.name}: {e}')
-            OUTBOX_FAILED.mkdir(parents=True, exist_ok=True)
-            try:
-                request = json.loads(filepath.read_text(encoding='utf-8-sig'))
-            except Exception:
-                request = {}
-            result_data = {**request, 'status': 'failed', 'error': str(e), 'failed_at': datetime.now().isoformat()}
-            dest = OUTBOX_FAILED / filepath.name
-            dest.write_text(json.dumps(result_data))
-            filepath.unlink()
+            logging.error(f'Failed to open chat with {contact} after {_format_timings(timings) or "0s"}: {e}')
+            for msg in batch:
+                await asyncio.to_thread(whatsapp_utils.nack, msg['id'], e)
             # Press Escape to reset UI state after failure
             try:
-                page.keyboard.press('Escape')
+                await page.keyboard.press('Escape')
             except Exception:
                 pass
+            continue
+        logging.info(f'Opened chat with {contact} ({_format_timings(timings)})')
 
+        for i, msg in enumerate(batch):
+            timings = {}
+            try:
+                await _send_in_open_chat(page, msg, timings)
+            except SendUnconfirmed as e:
+                logging.error(f'Message {msg["id"]} to {contact} submitted but not confirmed '
+                              f'after {_format_timings(timings)}: {e.__cause__}')
+                await _park_unconfirmed(msg['id'], e.__cause__)
+                continue
+            except Exception as e:
+                logging.error(f'Failed to send message {msg["id"]} after {_format_timings(timings) or "0s"}: {e}')
+                await asyncio.to_thread(whatsapp_utils.nack, msg['id'], e)
+                # Later messages must not overtake the one going back to the
+                # queue; claim() holds them until it has been retried
+                for later in batch[i + 1:]:
+                    await asyncio.to_thread(whatsapp_utils.release, later['id'])
+                break
+            logging.info(
+                f'Message {msg["id"]} sent to {contact} in {sum(timings.values()):.2f}s '
+                f'({_format_timings(timings)})'
+            )
+            try:
+                await asyncio.to_thread(whatsapp_utils.ack, msg['id'])
+            except Exception as e:
+                # Delivered; a nack here would send it again
+                await _park_unconfirmed(msg['id'], f'ack failed: {e}')
 
-def watch_whatsapp():
-    with sync_playwright() as p:
-        browser = p.chromium.launch_persistent_context(
-            str(SESSION), headless=True,
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        # Return to chat list
+        try:
+            await page.keyboard.press('Escape')
+        except Exception:
+            pass
+
+
+def _save_unread(chat, chat_key, message_id, cfg, account):
+    """Write a Needs_Action file for an unread chat and notify if urgent."""
+    text = chat['text']
+    text_lower = text.lower()
+    contact_name = chat['title']
+    found_kws = _check_message(text_lower, contact_name, cfg)
+
+    # Save ALL unread messages, flag keyword matches as urgent
+    is_urgent = len(found_kws) > 0
+    md = (
+        f'---\n'
+        f'type: whatsapp\n'
+        f'account: {account}\n'
+        f'contact: {contact_name}\n'
+        f'chat_id: {chat_key}\n'
+        f'message_id: {message_id}\n'
+        f'detected: {datetime.now().isoformat()}\n'
+        f'urgent: {str(is_urgent).lower()}\n'
+    )
+    if found_kws:
+        md += f'keywords_found: {", ".join(found_kws)}\n'
+    md += (
+        f'---\n\n'
+        f'## Message\n{text[:500]}\n'
+    )
+    filepath = VAULT / 'Needs_Action' / f'WHATSAPP_{int(time.time())}_{message_id[:8]}.md'
+    filepath.write_text(md)
+
+    if is_urgent:
+        logging.info(f'[{account}] Urgent WhatsApp from {contact_name} (keywords: {found_kws})')
+        notify(
+            f'WhatsApp Alert ({account})',
+            f'From: {contact_name}\nKeywords: {", ".join(found_kws)}'
         )
+    else:
+        logging.info(f'[{account}] WhatsApp from {contact_name} saved')
+
+
+def _ingest_unread(chats, cursors, cfg, account):
+    """File every chat whose latest message is past its cursor; returns True if any were."""
+    changed = False
+    for chat in chats:
+        chat_key, message_id = _message_identity(chat)
+        if cursors.get(chat_key, {}).get('last_id') == message_id:
+            continue
+        _save_unread(chat, chat_key, message_id, cfg, account)
+        cursors[chat_key] = {
+            'last_id': message_id,
+            'title': chat['title'],
+            'updated': datetime.now().isoformat(),
+        }
+        changed = True
+    return changed
+
+
+def _drain(queue):
+    items = list(queue)
+    queue.clear()
+    return items
+
+
+async def _new_context(browser, state_file, cfg):
+    """Create an isolated account context, blocking heavy resources in lean mode."""
+    context = await browser.new_context(
+        storage_state=str(state_file) if state_file.exists() else None,
+        user_agent=USER_AGENT,
+    )
+    if cfg.get('lean_mode', True):
+        blocked = set(cfg.get('blocked_resource_types', DEFAULT_BLOCKED_TYPES))
+
+        async def route_request(route):
+            if route.request.resource_type in blocked:
+                await route.abort()
+            else:
+                await route.continue_()
+        await context.route('**/*', route_request)
+        logging.info(f'Lean mode: blocking {", ".join(sorted(blocked))}')
+    return context
+
+
+async def _wait_for_login(page, account):
+    """Wait for the chat list, running the QR login flow if the session is gone."""
+    global _qr_server_started
+    logging.info(f'[{account}] Waiting for WhatsApp Web to load...')
+    try:
+        await page.wait_for_selector('[aria-label="Chat list"]', timeout=60000)
+        logging.info(f'[{account}] WhatsApp already authenticated from saved session!')
+        return
+    except Exception:
+        pass
 
-        # Graceful shutdown: close browser properly so session is saved
-        def shutdown(sig, frame):
-            logging.info('Shutting down, saving session...')
-            browser.close()
-            logging.info('Session saved. Exiting.')
-            exit(0)
-        signal.signal(signal.SIGTERM, shutdown)
-        signal.signal(signal.SIGINT, shutdown)
+    logging.info(f'[{account}] QR code required. Starting live QR server on http://localhost:8095')
+    if not _qr_server_started:
+        qr_thread = threading.Thread(target=serve_qr, daemon=True)
+        qr_thread.start()
+        _qr_server_started = True
 
-        page = browser.pages[0]
-        page.goto('https://web.whatsapp.com')
+    # Wait for any canvas (QR code) to appear
+    await page.wait_for_selector('canvas', timeout=30000)
+    await asyncio.sleep(2)
 
-        logging.info('Waiting for WhatsApp Web to load...')
+    for attempt in range(30):
+        await page.screenshot(path=str(QR_SCREENSHOT))
+        if attempt == 0:
+            logging.info(f'Open http://localhost:8095 and scan the QR with the phone for account "{account}"!')
         try:
-            page.wait_for_selector('[aria-label="Chat list"]', timeout=60000)
-            logging.info('WhatsApp already authenticated from saved session!')
+            await page.wait_for_selector('[aria-label="Chat list"]', timeout=10000)
+            break
         except Exception:
-            logging.info('QR code required. Starting live QR server on http://localhost:8095')
+            pass
+    else:
+        raise TimeoutError('QR scan not completed within 5 minutes')
+
+    logging.info(f'[{account}] WhatsApp connected after QR scan!')
+    QR_SCREENSHOT.unlink(missing_ok=True)
+
+
+async def _open_page(context, on_push, account):
+    """Prepare a page with the unread observer and load WhatsApp Web on it."""
+    page = await context.new_page()
+    # Installed before navigation so it survives reloads (e.g. send?phone= links)
+    await page.expose_binding('__waUnreadChanged', on_push)
+    await page.add_init_script(UNREAD_OBSERVER_JS)
+    await page.goto('https://web.whatsapp.com')
+    await _wait_for_login(page, account)
+    return page
+
+
+async def _migrate_legacy_session(p, state_file):
+    """Export the login from the old persistent profile into a storage-state file."""
+    logging.info(f'Migrating WhatsApp session from {LEGACY_SESSION}')
+    context = await p.chromium.launch_persistent_context(str(LEGACY_SESSION), headless=True, user_agent=USER_AGENT)
+    try:
+        page = context.pages[0] if context.pages else await context.new_page()
+        await page.goto('https://web.whatsapp.com')
+        await page.wait_for_selector('[aria-label="Chat list"]', timeout=60000)
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        await context.storage_state(path=str(state_file), indexed_db=True)
+    except Exception as e:
+        logging.warning(f'Could not migrate legacy session, QR login required: {e}')
+    finally:
+        await context.close()
+
+
+def _descendant_pids(root):
+    """PIDs of every process below root, read from /proc (Linux only)."""
+    children = {}
+    for stat in Path('/proc').glob('[0-9]*/stat'):
+        try:
+            # Field 4 is the parent PID; split after the ')' closing the command name
+            fields = stat.read_text().rsplit(')', 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+        except (OSError, IndexError, ValueError):
+            continue
+    pids, stack = [], [root]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            pids.append(child)
+            stack.append(child)
+    return pids
+
+
+def _browser_rss_mb():
+    """Total resident memory of the Playwright driver and Chromium processes, in MB."""
+    total_kb = 0
+    for pid in _descendant_pids(os.getpid()):
+        try:
+            for line in Path(f'/proc/{pid}/status').read_text().splitlines():
+                if line.startswith('VmRSS:'):
+                    total_kb += int(line.split()[1])
+                    break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
 
-            qr_thread = threading.Thread(target=serve_qr, daemon=True)
-            qr_thread.start()
 
-            # Wait for any canvas (QR code) to appear
-            page.wait_for_selector('canvas', timeout=30000)
-            time.sleep(2)
+class _Account:
+    """One WhatsApp account: its browser context, page and inbound state.
+
+    Every account gets its own context (cookies, IndexedDB) inside the
+    shared Chromium process; the login is persisted to a storage-state file
+    in the account's session directory. Tasks always go through this object,
+    so they pick up the new page or context after a memory recycle.
+
+    The state file is rewritten after every login and page recycle, every
+    session_save_interval seconds and on graceful shutdown. A killed watcher
+    restarts from the last snapshot, losing at most that interval of
+    IndexedDB changes; WhatsApp Web normally catches up from the phone, and
+    if it rejects the stale state the login wait falls back to a QR scan.
+    """
+
+    def __init__(self, p, browser, spec, primary):
+        self.p = p
+        self.browser = browser
+        self.name = spec['name']
+        self.primary = primary
+        self.session_dir = Path(spec.get('session_dir') or SESSIONS / self.name).expanduser()
+        self.state_file = self.session_dir / 'state.json'
+        # The primary account keeps the cursor file used before accounts existed
+        self.cursor_file = CURSOR_FILE if primary else WATCHER_DIR / f'wa_cursors_{self.name}.json'
+        self.context = None
+        self.page = None
+        self.pushed = []
+        self.wake = asyncio.Event()
+        # Held while the sender drives the page; recycling waits for it
+        self.page_lock = asyncio.Lock()
+
+    def on_push(self, source, chats):
+        self.pushed.extend(chats)
+        self.wake.set()
+
+    async def start(self):
+        if self.primary and not self.state_file.exists() and LEGACY_SESSION.exists():
+            await _migrate_legacy_session(self.p, self.state_file)
+        self.context = await _new_context(self.browser, self.state_file, get_whatsapp_config())
+        self.page = await _open_page(self.context, self.on_push, self.name)
+        await self.save_session()
+
+    async def save_session(self):
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix('.tmp')
+        await self.context.storage_state(path=str(tmp), indexed_db=True)
+        tmp.replace(self.state_file)
+
+    async def recycle_page(self):
+        # Close first: a second live WhatsApp Web tab in the context triggers
+        # the "use here" takeover screen and stalls the login wait
+        await self.page.close()
+        self.page = await _open_page(self.context, self.on_push, self.name)
+        await self.save_session()
+
+    async def restart(self):
+        await self.close()
+        await self.start()
+
+    async def close(self):
+        await self.save_session()
+        await self.context.close()
+
+
+async def _inbound_loop(account):
+    """File unread chats as soon as the observer pushes them."""
+    cursors = _load_cursors(account.cursor_file)
+    last_reconcile = 0
+    while True:
+        cfg = get_whatsapp_config()
+        check_interval = cfg.get('check_interval', 30)
+        reconcile_interval = cfg.get('reconcile_interval', 300)
+        account.wake.clear()
+        try:
+            chats = _drain(account.pushed)
+            if time.time() - last_reconcile >= reconcile_interval:
+                # Safety net in case the observer missed a change or was detached
+                chats += await account.page.evaluate(EXTRACT_UNREAD_JS)
+                last_reconcile = time.time()
+            if chats and await asyncio.to_thread(_ingest_unread, chats, cursors, cfg, account.name):
+                await asyncio.to_thread(_save_cursors, cursors, account.cursor_file)
+        except Exception as e:
+            logging.error(f'[{account.name}] WA inbound error: {e}')
+        try:
+            await asyncio.wait_for(account.wake.wait(), timeout=check_interval)
+        except asyncio.TimeoutError:
+            pass
 
-            for attempt in range(30):
-                page.screenshot(path=str(QR_SCREENSHOT))
-                if attempt == 0:
-                    logging.info('Open http://localhost:8095 in your browser and scan the QR with your phone!')
-                try:
-                    page.wait_for_selector('[aria-label="Chat list"]', timeout=10000)
-                    break
-                except Exception:
-                    pass
-            else:
-                raise TimeoutError('QR scan not completed within 5 minutes')
 
-            logging.info('WhatsApp connected after QR scan!')
-            QR_SCREENSHOT.unlink(missing_ok=True)
+async def _outbound_loop(account):
+    """Drain the account's outbox independently of inbound detection."""
+    while True:
+        try:
+            async with account.page_lock:
+                await _process_outbox(account.page, account.name)
+        except Exception as e:
+            logging.error(f'[{account.name}] WA outbox error: {e}')
+        await asyncio.sleep(get_whatsapp_config().get('outbox_interval', 5))
 
-        processed = set()
-        logging.info('WhatsApp watcher started, monitoring all unread messages...')
 
-        while True:
+async def _session_loop(accounts):
+    """Snapshot every account's login often, so a killed watcher restarts from a recent one."""
+    while True:
+        await asyncio.sleep(get_whatsapp_config().get('session_save_interval', 60))
+        for account in accounts:
             try:
-                _process_outbox(page)
-
-                cfg = get_whatsapp_config()
-                check_interval = cfg.get('check_interval', 30)
-
-                unread = page.query_selector_all('[aria-label*="unread"]')
-                for chat in unread:
-                    text = chat.inner_text()
-                    text_lower = text.lower()
-                    chat_id = hash(text[:100])
-                    if chat_id in processed:
-                        continue
-
-                    # Extract contact name (first line of chat element text)
-                    contact_name = text.split('\n')[0] if text else ''
-                    found_kws = _check_message(text_lower, contact_name, cfg)
-
-                    # Save ALL unread messages, flag keyword matches as urgent
-                    is_urgent = len(found_kws) > 0
-                    md = (
-                        f'---\n'
-                        f'type: whatsapp\n'
-                        f'contact: {contact_name}\n'
-                        f'detected: {datetime.now().isoformat()}\n'
-                        f'urgent: {str(is_urgent).lower()}\n'
-                    )
-                    if found_kws:
-                        md += f'keywords_found: {", ".join(found_kws)}\n'
-                    md += (
-                        f'---\n\n'
-                        f'## Message\n{text[:500]}\n'
-                    )
-                    filepath = VAULT / 'Needs_Action' / f'WHATSAPP_{int(time.time())}.md'
-                    filepath.write_text(md)
-
-                    if is_urgent:
-                        logging.info(f'Urgent WhatsApp from {contact_name} (keywords: {found_kws})')
-                        notify(
-                            'WhatsApp Alert',
-                            f'From: {contact_name}\nKeywords: {", ".join(found_kws)}'
-                        )
-                    else:
-                        logging.info(f'WhatsApp from {contact_name} saved')
-
-                    processed.add(chat_id)
+                await account.save_session()
             except Exception as e:
-                logging.error(f'WA error: {e}')
-            time.sleep(check_interval)
+                logging.error(f'[{account.name}] Could not save WhatsApp session: {e}')
+
+
+async def _maintenance_loop(accounts):
+    """Keep the shared browser under the RSS cap.
+
+    Pages are recycled first; if that is not enough the account contexts
+    are restarted from their saved sessions.
+    """
+    while True:
+        cfg = get_whatsapp_config()
+        await asyncio.sleep(cfg.get('memory_check_interval', 300))
+        try:
+            max_rss = cfg.get('max_rss_mb', 1500)
+            rss = await asyncio.to_thread(_browser_rss_mb)
+            if rss > max_rss:
+                logging.warning(f'Browser RSS {rss:.0f}MB exceeds {max_rss}MB, recycling pages')
+                for account in accounts:
+                    async with account.page_lock:
+                        await account.recycle_page()
+                rss = await asyncio.to_thread(_browser_rss_mb)
+                if rss > max_rss:
+                    logging.warning(f'Browser RSS still {rss:.0f}MB, restarting account contexts')
+                    for account in accounts:
+                        async with account.page_lock:
+                            await account.restart()
+                    rss = await asyncio.to_thread(_browser_rss_mb)
+            logging.info(f'Browser RSS: {rss:.0f}MB across {len(accounts)} account(s)')
+        except Exception as e:
+            logging.error(f'WA memory check error: {e}')
+
+
+async def _watch():
+    cfg = get_whatsapp_config()
+    specs = cfg.get('accounts') or [{'name': whatsapp_utils.DEFAULT_ACCOUNT}]
+    async with async_playwright() as p:
+        # One Chromium process shared by every account
+        browser = await p.chromium.launch(headless=True)
+        accounts = [_Account(p, browser, spec, i == 0) for i, spec in enumerate(specs)]
+        # Started one at a time so at most one QR login is pending
+        for account in accounts:
+            await account.start()
+
+        await asyncio.to_thread(whatsapp_utils.import_legacy_files)
+
+        # Graceful shutdown: close contexts properly so sessions are saved
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+        names = ', '.join(a.name for a in accounts)
+        logging.info(f'WhatsApp watcher started for {names}, monitoring all unread messages...')
+        tasks = [asyncio.create_task(_maintenance_loop(accounts)), asyncio.create_task(_session_loop(accounts))]
+        for account in accounts:
+            tasks.append(asyncio.create_task(_inbound_loop(account)))
+            tasks.append(asyncio.create_task(_outbound_loop(account)))
+        await stop.wait()
+
+        logging.info('Shutting down, saving sessions...')
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for account in accounts:
+            try:
+                await account.close()
+            except Exception as e:
+                logging.error(f'[{account.name}] Could not save WhatsApp session: {e}')
+        await browser.close()
+        logging.info('Sessions saved. Exiting.')
+
+
+def watch_whatsapp():
+    asyncio.run(_watch())
 
 
 if __name__ == '__main__':